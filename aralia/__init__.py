@@ -0,0 +1,25 @@
+from .async_client import AsyncAraliaClient
+from .breaker import CircuitBreaker
+from .cache import DiskCache, TTLCache, normalize_keyword
+from .client import AraliaClient
+from .columnar import ColumnarRows
+from .errors import AraliaAPIError, CircuitOpenError
+from .fuzzy import CandidateIndex
+from .http import SessionPool, default_pool
+from .token import TokenManager
+
+__all__ = [
+    "AraliaAPIError",
+    "AraliaClient",
+    "AsyncAraliaClient",
+    "CandidateIndex",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ColumnarRows",
+    "DiskCache",
+    "SessionPool",
+    "TTLCache",
+    "TokenManager",
+    "default_pool",
+    "normalize_keyword",
+]
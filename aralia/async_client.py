@@ -0,0 +1,688 @@
+import asyncio
+import copy
+import threading
+import time
+import weakref
+from contextlib import aclosing
+from functools import partial
+
+import httpx
+
+from config import setting
+from .breaker import CircuitBreaker, breaker
+from .cache import (
+    DiskCache,
+    TTLCache,
+    filter_options_cache,
+    metadata_cache,
+    normalize_keyword,
+    search_cache,
+)
+from .codec import ACCEPT_ENCODING
+from .columnar import ColumnarRows
+from .errors import AraliaAPIError
+from .exploration import (
+    atake_rows,
+    explore_url,
+    has_more,
+    page_rows,
+    set_explore_result,
+    single_page_rows,
+)
+from .fuzzy import preselect_candidates
+from .http import SessionPool
+from .metadata import NOT_MODIFIED, cached_columns, collect_columns, columns_url
+from .metrics import endpoint, record_call, span
+from .options import (
+    filter_options_key,
+    filter_options_record,
+    filter_options_url,
+    narrow_values,
+    option_values,
+    question_keywords,
+    search_terms,
+    warm_up_targets,
+)
+from .retry import RETRY_STATUSES, backoff_delay, response_body, response_data
+from .search import galaxy_search_url, merge_search_results
+from .singleflight import AsyncSingleFlight, async_flights, request_key
+from .token import TokenManager
+
+
+class AsyncAraliaClient:
+    """
+    asyncio counterpart of `AraliaClient` built on `httpx.AsyncClient`.
+
+    Logs in on the first request instead of in `__init__`, so it can be created
+    outside of a running event loop.
+    """
+
+    # 要搜尋的星系, None 時使用 setting["search"]["galaxies"]
+    galaxy_urls: list = None
+
+    search_cache: TTLCache = search_cache
+    metadata_cache: DiskCache = metadata_cache
+    filter_options_cache: TTLCache = filter_options_cache
+    flights: AsyncSingleFlight = async_flights
+    breaker: CircuitBreaker = breaker
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.tokens = TokenManager(username, password)
+
+        # 每個 event loop 各自一個 httpx client 與 per-host semaphore,
+        # 同一個 client 被不同 thread 的 loop 共用時不會互相關掉連線
+        self._loops = weakref.WeakKeyDictionary()  # loop -> {client, limits, closer}
+        self._lock = threading.Lock()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if (state := self._loops.get(loop)) is None:
+                http = setting["http"]
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_keepalive_connections=(
+                            http["pool_maxsize"] if http["keep_alive"] else 0
+                        ),
+                    ),
+                    timeout=httpx.Timeout(
+                        http["read_timeout"], connect=http["connect_timeout"]
+                    ),
+                    headers={
+                        "Accept-Encoding": (
+                            ACCEPT_ENCODING if http["compress"] else "identity"
+                        )
+                    },
+                )
+                state = self._loops[loop] = {
+                    "client": client,
+                    "limits": {},
+                    "closer": self._close_with_loop(loop, client),
+                }
+                # 先在這個 loop 裡跑到 yield, loop 才會在關閉前 aclose 這個 generator
+                loop.create_task(anext(state["closer"], None))
+
+        return state
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """httpx client of the running event loop."""
+
+        return self._loop_state()["client"]
+
+    async def _close_with_loop(self, loop, client):
+        # asyncio.run 結束前會關掉所有還沒跑完的 async generator,
+        # 藉此在 event loop 關閉前關掉這個 loop 的 httpx client 與連線
+        try:
+            yield
+        finally:
+            with self._lock:
+                if (state := self._loops.get(loop)) and state["client"] is client:
+                    del self._loops[loop]
+            await client.aclose()
+
+    @staticmethod
+    async def _aclose(state):
+        # closer 還沒跑到 yield 時 aclose 不會執行 finally, client 另外關
+        await state["closer"].aclose()
+        await state["client"].aclose()
+
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        state = self._loop_state()
+        host = SessionPool.host(url)
+        if host not in state["limits"]:
+            state["limits"][host] = asyncio.Semaphore(setting["http"]["per_host_limit"])
+
+        async with state["limits"][host]:
+            return await state["client"].request(method, url, **kwargs)
+
+    async def login(self):
+        return await asyncio.to_thread(self.tokens.refresh)
+
+    async def get(self, url, query={}):
+        """
+        Sends a GET request with an Authorization Bearer token and retrieves the response.
+
+        Args:
+            url (str): Endpoint to send the GET request to.
+            query (dict, optional): Query parameters to include in the GET request. Defaults to an empty dictionary.
+
+        Returns:
+            dict or list: Parsed response based on `allData` and response structure.
+        """
+
+        return await self._send("GET", url, params=query)
+
+    async def post(self, url, query={}):
+        """
+        Sends a POST request with an Authorization Bearer token and retrieves the response.
+
+        Args:
+            url (str): Endpoint to send the POST request to.
+            query (dict, optional): JSON body of the POST request. Defaults to an empty dictionary.
+
+        Returns:
+            dict or list: Parsed response based on `allData` and response structure.
+        """
+
+        return await self._send("POST", url, json=query)
+
+    async def _send(self, method, url, **kwargs):
+        return await self._coalesce(self._send_request, method, url, **kwargs)
+
+    async def _send_request(self, method, url, **kwargs):
+        response = await self._request(method, url, **kwargs)
+        data = response_data(method, url, response)
+
+        return data.get("list", data)
+
+    async def _coalesce(self, call, *args, **kwargs):
+        """
+        Awaits `call(*args, **kwargs)`, or an identical call already in flight
+        and shares its parsed result, see `AsyncSingleFlight`.
+        """
+
+        return await self.flights.do(
+            request_key(call.__name__, self.username, *args, **kwargs),
+            partial(call, *args, **kwargs),
+        )
+
+    async def _request(self, method, url, headers=None, **kwargs):
+        """
+        Sends an authorized request, retrying like `AraliaClient._request`.
+
+        Returns:
+            httpx.Response: A 200 or 304 response.
+
+        Raises:
+            AraliaAPIError: Any other status, or retries exhausted.
+            CircuitOpenError: The host's breaker is open.
+        """
+
+        retry = setting["retry"]
+        host = SessionPool.host(url)
+        kind = endpoint(url)
+        refreshed = False
+        attempt = 0
+
+        while True:
+            # 只有需要登入時才丟到 thread, 一般情況不會阻塞 event loop
+            token = self.tokens.current() or await asyncio.to_thread(self.tokens.get)
+            self.breaker.before(host)
+            record_call(kind)
+            retry_after = None
+
+            try:
+                with span("aralia", kind, method=method, attempt=attempt) as timing:
+                    response = await self.request(
+                        method,
+                        url,
+                        headers={**(headers or {}), "Authorization": f"Bearer {token}"},
+                        **kwargs,
+                    )
+                    timing.attrs["status"] = response.status_code
+                    if response.status_code not in (200, 304):
+                        timing.error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                self.breaker.failure(host)
+                error = AraliaAPIError(f"{method} {url} 失敗: {e!r}", url=url)
+                error.__cause__ = e
+            else:
+                status = response.status_code
+                if status >= 500:
+                    self.breaker.failure(host)
+                else:
+                    self.breaker.success(host)
+
+                if status in (200, 304):
+                    return response
+
+                error = AraliaAPIError.from_response(
+                    method, url, status, response_body(response)
+                )
+
+                if status in (401, 403) and not refreshed:
+                    await asyncio.to_thread(self.tokens.refresh, token)
+                    refreshed = True
+                    continue
+                if status not in RETRY_STATUSES:
+                    raise error
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt >= retry["retries"]:
+                raise error
+
+            self.breaker.retried(host)
+            record_call("retries")
+            with span("retry", kind, attempt=attempt):
+                await asyncio.sleep(
+                    backoff_delay(
+                        attempt, retry["backoff"], retry["backoff_max"], retry_after
+                    )
+                )
+            attempt += 1
+
+    async def _conditional_get(self, url, etag=None):
+        """
+        GET that revalidates with `If-None-Match` when an ETag is known.
+
+        Returns:
+            tuple: `(data, etag)`, `data` is `NOT_MODIFIED` on 304.
+        """
+
+        return await self._coalesce(self._conditional_request, url, etag)
+
+    async def _conditional_request(self, url, etag=None):
+        response = await self._request(
+            "GET", url, headers={"If-None-Match": etag} if etag else None
+        )
+
+        if response.status_code == 304:
+            return NOT_MODIFIED, etag
+
+        data = response_data("GET", url, response)
+
+        return data.get("list", data), response.headers.get("ETag")
+
+    def galaxies(self):
+        """Galaxy API URLs to search, `galaxy_urls` or `setting["search"]["galaxies"]`."""
+
+        return self.galaxy_urls or setting["search"]["galaxies"]
+
+    async def search_datasets(self, question):
+        """
+        Searches `/galaxy/dataset` of every galaxy concurrently and merges the
+        results, see `merge_search_results`. A galaxy that fails or does not
+        answer within `setting["search"]["timeout"]` seconds is left out.
+        Results are cached per account, galaxy and normalized question, so repeated
+        questions skip the network.
+
+        Returns:
+            list: A fresh copy of the merged search results, safe to mutate.
+        """
+
+        galaxies = self.galaxies()
+        search = setting["search"]
+
+        # 先登入, 登入時間不算在各星系的 timeout 內
+        self.tokens.current() or await asyncio.to_thread(self.tokens.get)
+
+        responses = await asyncio.gather(
+            *[
+                asyncio.wait_for(
+                    self._search_galaxy(galaxy, question), search["timeout"]
+                )
+                for galaxy in galaxies
+            ],
+            return_exceptions=True,
+        )
+
+        return copy.deepcopy(
+            merge_search_results(galaxies, responses, search["max_results"])
+        )
+
+    async def _search_galaxy(self, galaxy, question):
+        key = (self.username, galaxy, normalize_keyword(question))
+
+        if (response := self.search_cache.get(key)) is None:
+            response = await self.get(
+                galaxy_search_url(galaxy),
+                {"keyword": question, "pageSize": setting["search"]["page_size"]},
+            )
+            self.search_cache.set(key, response)
+
+        return response
+
+    async def fetch_columns(self, datasets):
+        """
+        Returns the projected columns of every dataset. Fresh entries of the
+        on-disk metadata cache are used as is; the `/api/dataset/{id}` and
+        `/virtual-variables` GETs of the rest are issued concurrently,
+        revalidating stale entries with their ETags.
+
+        Args:
+            datasets (list): Datasets with `sourceURL` and `id`.
+
+        Returns:
+            list: Projected columns per dataset in input order, `None` for a failed dataset.
+        """
+
+        cached = cached_columns(self.metadata_cache, self.username, datasets)
+
+        requests = []
+        for dataset, (entry, fresh) in zip(datasets, cached):
+            if not fresh:
+                etags = entry["etags"] if entry else {}
+                url = columns_url(dataset)
+                requests += [
+                    self._conditional_get(url, etags.get("columns")),
+                    self._conditional_get(
+                        url + "/virtual-variables", etags.get("virtual")
+                    ),
+                ]
+
+        results = iter(await asyncio.gather(*requests, return_exceptions=True))
+
+        return [
+            (
+                entry["columns"] + entry["virtual"]
+                if fresh
+                else collect_columns(
+                    self.metadata_cache,
+                    self.username,
+                    dataset,
+                    entry,
+                    next(results),
+                    next(results),
+                )
+            )
+            for dataset, (entry, fresh) in zip(datasets, cached)
+        ]
+
+    async def fetch_filter_options(self, datasets, question=None):
+        """
+        Enumerates the candidate values of every filter column of every dataset
+        in parallel, at most `setting["concurrency"]["filter_options"]` at a time.
+
+        Args:
+            datasets (list): Datasets with `sourceURL`, `id` and `filter`.
+            question (str, optional): User question. Its keywords narrow down
+                columns with more values than fit in one page, and each column
+                keeps only its `setting["filter_options"]["top_k"]` values most
+                similar to it, see `CandidateIndex`.
+
+        Returns:
+            list: One record per filter column in input order, see `filter_options_record`.
+        """
+
+        options = setting["filter_options"]
+        keywords = question_keywords(question or "", options["max_keywords"])
+        limit = asyncio.Semaphore(setting["concurrency"]["filter_options"])
+
+        async def fetch(dataset, filter_column):
+            key = filter_options_key(self.username, dataset, filter_column)
+
+            if (values := self.filter_options_cache.get(key)) is not None:
+                return filter_options_record(
+                    dataset, filter_column, values, time.perf_counter(), cached=True
+                )
+
+            async with limit:
+                return await self._filter_options(dataset, filter_column, keywords)
+
+        records = await asyncio.gather(
+            *[
+                fetch(dataset, filter_column)
+                for dataset in datasets
+                for filter_column in dataset["filter"]
+            ]
+        )
+
+        if question and options["top_k"]:
+            preselect_candidates(records, question, options["top_k"])
+
+        return records
+
+    async def _filter_options(self, dataset, filter_column, keywords=()):
+        start = time.perf_counter()
+        options = setting["filter_options"]
+        narrowed = False
+        total = None
+
+        try:
+            page_url = partial(filter_options_url, dataset)
+            body = {"x": [filter_column]}
+            # 第一頁不預先抓下一頁: 要縮小範圍的話, 下一頁就用不到了
+            rows, total = await self._fetch_page(
+                page_url, body, options["page_size"], 0
+            )
+            values = option_values(rows)
+            more = has_more(len(rows), len(rows), total, options["page_size"])
+
+            # 一頁放不下的欄位先用關鍵字請 server 縮小範圍
+            if keywords and options["narrow"] and more:
+                if narrowed_values := await self._narrow_filter_options(
+                    dataset, filter_column, keywords
+                ):
+                    values, narrowed = narrowed_values, True
+
+            if not narrowed and more and len(values) < options["max_values"]:
+                pages = self._iter_pages(
+                    page_url, body, options["page_size"], start=len(rows)
+                )
+                async with aclosing(pages):
+                    async for rows, total in pages:
+                        values += option_values(rows)
+                        if len(values) >= options["max_values"]:
+                            break
+            values = values[: options["max_values"]]
+        except Exception as e:
+            values = e
+
+        record = filter_options_record(
+            dataset, filter_column, values, start, narrowed=narrowed, total=total
+        )
+        if not (record["error"] or narrowed or record["truncated"]):
+            self.filter_options_cache.set(
+                filter_options_key(self.username, dataset, filter_column),
+                tuple(record["values"]),
+            )
+
+        return record
+
+    async def _narrow_filter_options(self, dataset, filter_column, keywords):
+        values = []
+        for keyword in search_terms(keywords):
+            async for page in self.iter_filter_options(dataset, filter_column, keyword):
+                values += page
+                if len(values) >= setting["filter_options"]["max_values"]:
+                    break
+
+        return narrow_values(list(dict.fromkeys(values)), keywords)
+
+    async def iter_filter_options(
+        self, dataset, filter_column, keyword=None, page_size=None
+    ):
+        """
+        Lazily pages through the candidate values of one filter column.
+
+        Args:
+            dataset (dict): Dataset with `sourceURL` and `id`.
+            filter_column (dict): Filter column sent as `x`.
+            keyword (str, optional): Asks the server for matching values only.
+            page_size (int, optional): Values per request, defaults to `setting["filter_options"]["page_size"]`.
+
+        Yields:
+            list: Values of one page.
+        """
+
+        pages = self._iter_pages(
+            partial(filter_options_url, dataset, keyword=keyword),
+            {"x": [filter_column]},
+            page_size or setting["filter_options"]["page_size"],
+        )
+
+        async with aclosing(pages):
+            async for rows, _ in pages:
+                yield option_values(rows)
+
+    async def warm_filter_options(self, datasets):
+        """
+        Preloads the filter-options cache with the candidates of every nominal
+        column, and of every space column in `warm_space_formats`, so the
+        filter step rarely has to wait for the network.
+
+        Args:
+            datasets (list): Datasets with `sourceURL` and `id`.
+
+        Returns:
+            list: Records of `fetch_filter_options`, `cached` ones were already loaded.
+        """
+
+        return await self.fetch_filter_options(
+            warm_up_targets(
+                datasets,
+                await self.fetch_columns(datasets),
+                setting["cache"]["filter_options"]["warm_space_formats"],
+            )
+        )
+
+    async def explore(self, charts, columnar=None, max_rows=None):
+        """
+        Runs the exploration of every chart concurrently. Each chart gets its
+        `data`, or `error` when its request failed, as soon as it finishes.
+
+        Args:
+            charts (list): Charts with `sourceURL`, `id`, `x`, `y` and `filter`.
+            columnar (bool, optional): Store `data` as `ColumnarRows` instead of
+                a list of row dicts, defaults to `setting["exploration"]["columnar"]`.
+            max_rows (int, optional): Rows kept per chart, paging even when
+                `setting["exploration"]["paginate"]` is off; defaults to
+                `setting["exploration"]["max_rows"]`.
+        """
+
+        exploration = setting["exploration"]
+        if columnar is None:
+            columnar = exploration["columnar"]
+        if exploration["paginate"] or max_rows is not None:
+            max_rows = max_rows or exploration["max_rows"]
+
+        async def explore(chart):
+            truncated = False
+
+            try:
+                if max_rows and max_rows < exploration["page_size"]:
+                    # 一頁放得下: 只送一個 request, 多要一筆判斷是否截斷
+                    rows, total = await self._fetch_page(
+                        partial(explore_url, chart), chart, max_rows + 1, 0
+                    )
+                    response, truncated = single_page_rows(rows, total, max_rows)
+                    if columnar:
+                        response = ColumnarRows(response)
+                elif max_rows:
+                    response, truncated = await atake_rows(
+                        self.iter_explore_pages(chart),
+                        max_rows,
+                        ColumnarRows() if columnar else None,
+                    )
+                else:
+                    response = await self.post(explore_url(chart), chart)
+                    if columnar:
+                        response = ColumnarRows(response)
+            except Exception as e:
+                response = e
+
+            set_explore_result(chart, response, truncated)
+
+        await asyncio.gather(*[explore(chart) for chart in charts])
+
+    async def iter_explore_pages(self, chart, page_size=None):
+        """
+        Lazily pages through a chart's exploration by `start` offset.
+
+        Args:
+            chart (dict): Chart with `sourceURL`, `id`, `x`, `y` and `filter`.
+            page_size (int, optional): Rows per request, defaults to `setting["exploration"]["page_size"]`.
+
+        Yields:
+            list: Rows of one page.
+        """
+
+        pages = self._iter_pages(
+            partial(explore_url, chart),
+            chart,
+            page_size or setting["exploration"]["page_size"],
+        )
+
+        async with aclosing(pages):
+            async for rows, _ in pages:
+                yield rows
+
+    async def _iter_pages(self, page_url, body, page_size, start=0):
+        """
+        POSTs `body` to successive `start` offsets until the rows run out. The
+        next page is requested while the caller is still processing the current one.
+
+        Args:
+            page_url (callable): Builds the URL from `(start, page_size)`.
+            body (dict): JSON body of every page request.
+            page_size (int): Rows per request.
+            start (int, optional): Offset of the first page.
+
+        Yields:
+            tuple: `(rows, total)` of each page, see `page_rows`.
+        """
+
+        fetch = partial(self._fetch_page, page_url, body, page_size)
+
+        rows, total = await fetch(start)
+        prefetch = None
+
+        try:
+            while rows:
+                start += len(rows)
+                prefetch = (
+                    asyncio.create_task(fetch(start))
+                    if has_more(len(rows), start, total, page_size)
+                    else None
+                )
+
+                yield rows, total
+
+                if prefetch is None:
+                    break
+                rows, total = await prefetch
+        finally:
+            # 呼叫端提早結束時取消還在進行的預先抓取
+            if prefetch is not None and not prefetch.done():
+                prefetch.cancel()
+
+    async def _fetch_page(self, page_url, body, page_size, start):
+        return await self._coalesce(
+            self._page_request, page_url(start, page_size), body
+        )
+
+    async def _page_request(self, url, body):
+        response = await self._request("POST", url, json=body)
+
+        return page_rows(response_data("POST", url, response))
+
+    def token_stats(self):
+        return self.tokens.stats()
+
+    def breaker_stats(self):
+        """Circuit breaker state and retry count per host, see `CircuitBreaker.stats`."""
+
+        return self.breaker.stats()
+
+    def coalescing_stats(self):
+        """`calls` made, `requests` actually sent and `collapsed` calls that shared one."""
+
+        return self.flights.stats()
+
+    async def aclose(self):
+        """
+        Closes the httpx clients and their connections: the running loop's,
+        and those of loops still running in other threads. Clients of loops
+        that are not running are closed when their loop shuts down. The next
+        request opens a new client.
+        """
+
+        current = asyncio.get_running_loop()
+        with self._lock:
+            states = {
+                loop: self._loops.pop(loop)
+                for loop in list(self._loops)
+                if loop is current or loop.is_running()
+            }
+
+        for loop, state in states.items():
+            if loop is current:
+                await self._aclose(state)
+            else:
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(self._aclose(state), loop)
+                )
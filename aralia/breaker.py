@@ -0,0 +1,105 @@
+import threading
+import time
+
+from config import setting
+from .errors import CircuitOpenError
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `failures` consecutive failures the host
+    is `open` and calls fail fast with `CircuitOpenError`; once `reset`
+    seconds have passed one probe call is let through (`half_open`), which
+    closes the breaker on success or opens it again on failure.
+
+    Also counts the retries made against each host.
+
+    Args:
+        failures (int): Consecutive failures that open the breaker.
+        reset (float): Seconds an open breaker waits before probing.
+    """
+
+    def __init__(self, failures=5, reset=30):
+        self.failures = failures
+        self.reset = reset
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "state": "closed",
+                "consecutive_failures": 0,
+                "opened_at": None,
+                "probing": False,
+                "probe_at": None,
+                "opened": 0,
+                "rejected": 0,
+                "retries": 0,
+            }
+
+        return self._hosts[host]
+
+    def before(self, host):
+        """Raises `CircuitOpenError` when `host` must not be called now."""
+
+        with self._lock:
+            state = self._host(host)
+
+            if state["state"] == "open":
+                if time.monotonic() - state["opened_at"] >= self.reset:
+                    state["state"] = "half_open"
+                else:
+                    state["rejected"] += 1
+                    raise CircuitOpenError(
+                        f"{host} 連續失敗, {self.reset} 秒內不再送出 request", url=host
+                    )
+
+            if state["state"] == "half_open":
+                # 只放一個 request 去試, 其他的直接失敗; 試的 request 被取消時 reset 秒後再放一個
+                now = time.monotonic()
+                if state["probing"] and now - state["probe_at"] < self.reset:
+                    state["rejected"] += 1
+                    raise CircuitOpenError(f"{host} 正在重新測試中", url=host)
+                state.update(probing=True, probe_at=now)
+
+    def success(self, host):
+        with self._lock:
+            state = self._host(host)
+            state.update(state="closed", consecutive_failures=0, probing=False)
+
+    def failure(self, host):
+        with self._lock:
+            state = self._host(host)
+            state["consecutive_failures"] += 1
+            state["probing"] = False
+
+            if (
+                state["state"] == "half_open"
+                or state["consecutive_failures"] >= self.failures
+            ):
+                if state["state"] != "open":
+                    state["opened"] += 1
+                state.update(state="open", opened_at=time.monotonic())
+
+    def retried(self, host):
+        with self._lock:
+            self._host(host)["retries"] += 1
+
+    def stats(self):
+        """Per host: `state`, `consecutive_failures`, times `opened`, calls `rejected` and `retries`."""
+
+        with self._lock:
+            return {
+                host: {
+                    key: value
+                    for key, value in state.items()
+                    if key not in ("opened_at", "probing", "probe_at")
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+# 所有 AraliaTools 共用, 一個 client 發現星球掛了其他 client 也不再等
+breaker = CircuitBreaker(**setting["breaker"])
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from config import setting
+
+from .codec import loads
+
+
+def normalize_keyword(text):
+    """
+    Folds near-identical questions onto the same cache key: full-width to
+    half-width (NFKC), case folding and collapsed whitespace.
+    """
+
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after they were set.
+
+    Args:
+        maxsize (int): Maximum total weight, the least recently used entries are evicted first.
+        ttl (float): Seconds an entry stays valid.
+        weigh (callable, optional): Weight of a value, every entry weighs 1 by default.
+    """
+
+    def __init__(self, maxsize=256, ttl=600, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh or (lambda value: 1)
+
+        self._data = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            if (entry := self._data.get(key)) is None:
+                self._stats["misses"] += 1
+                return default
+
+            value, expires_at, weight = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._weight -= weight
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        weight = self.weigh(value)
+
+        with self._lock:
+            if (entry := self._data.pop(key, None)) is not None:
+                self._weight -= entry[2]
+
+            # 單筆就超過上限的不快取
+            if weight > self.maxsize:
+                return
+
+            self._data[key] = (value, time.monotonic() + self.ttl, weight)
+            self._weight += weight
+
+            while self._weight > self.maxsize:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._weight -= evicted
+                self._stats["evictions"] += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if (entry := self._data.pop(key, None)) is None:
+                return default
+
+            self._weight -= entry[2]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._data),
+                "weight": self._weight,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+class DiskCache:
+    """
+    Persistent JSON key-value store on SQLite, shared across processes.
+
+    Entries older than `ttl` are still returned, flagged as stale, so the caller
+    can revalidate them (e.g. with an ETag) instead of downloading them again.
+    The database is opened on first use.
+
+    Args:
+        path (str): SQLite file, `~` is expanded and missing directories are created.
+        ttl (float): Seconds an entry is considered fresh.
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "writes": 0, "touches": 0}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns:
+            tuple or None: `(value, fresh)`, `None` when the key was never stored.
+        """
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            fresh = time.time() - row[1] < self.ttl
+            self._stats["hits" if fresh else "stale"] += 1
+
+        return loads(row[0]), fresh
+
+    def set(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, data, time.time()),
+            )
+            self._stats["writes"] += 1
+
+    def touch(self, key):
+        """Marks a revalidated entry as fresh again."""
+
+        with self._lock:
+            self.conn.execute(
+                "UPDATE entries SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._stats["touches"] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+# 以下快取 MCP server 與 LangGraph 共用; 各帳號可見的資料集不同, key 都含帳號
+
+# galaxy dataset 搜尋結果
+search_cache = TTLCache(**setting["cache"]["search"])
+
+# 投影後的資料集欄位, 存在硬碟上跨 process 共用
+metadata_cache = DiskCache(**setting["cache"]["metadata"])
+
+# filter-options 候選值, 以候選值總數計算大小
+filter_options_cache = TTLCache(
+    maxsize=setting["cache"]["filter_options"]["maxsize"],
+    ttl=setting["cache"]["filter_options"]["ttl"],
+    weigh=len,
+)
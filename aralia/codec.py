@@ -0,0 +1,31 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # 沒裝 orjson 時用標準庫
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# requests (urllib3) 與 httpx 都是在有 brotli 套件時才能解 br
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
+JSON_BACKEND = "orjson" if orjson else "json"
+
+
+def loads(content):
+    """
+    Decodes a JSON response body (bytes or str) with orjson when it is
+    installed, the stdlib parser otherwise. Both give the same objects.
+    """
+
+    if orjson is not None:
+        return orjson.loads(content)
+
+    return json.loads(content)
@@ -0,0 +1,250 @@
+from array import array
+
+_int64 = (-(2**63), 2**63)
+
+
+class ColumnarRows:
+    """
+    Column-oriented storage of exploration rows (`{"x": [[...], ...], "values": [...]}`).
+
+    Every x dimension is dictionary-encoded: its distinct labels are stored
+    once and each row keeps a 4-byte code. Value columns are typed by their
+    first non-null value and packed into `array("q")` (int) or `array("d")`
+    (float). Anything that does not fit its column (nulls, mixed types) is
+    kept verbatim in `overrides`, and rows of another shape in `irregular`,
+    so `to_rows()` always gives back the original rows.
+
+    Rows can be appended page by page, so it also works as the accumulator of `take_rows`.
+    """
+
+    def __init__(self, rows=()):
+        self.labels = []  # 每個 x 維度的不重複 label
+        self.codes = []  # 每個 x 維度每一列的 label 編號
+        self.values = []  # 每個 values 欄位, array 或 list
+        self.overrides = []  # 每個 values 欄位無法放進 array 的值 {列: 值}
+        self.irregular = {}  # 形狀不同的列 {列: row}
+
+        self._lookup = []
+        self._shape = None
+        self._size = 0
+
+        self.extend(rows)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def __repr__(self):
+        # 與原本的 list of dict 相同, 直接放進 prompt 時內容不變
+        return repr(self.to_rows())
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        index = self._size
+
+        if self._shape is None and self._regular(row, None):
+            self._shape = (len(row["x"]), len(row["values"]))
+            self.labels = [[] for _ in row["x"]]
+            self.codes = [array("I") for _ in row["x"]]
+            self._lookup = [{} for _ in row["x"]]
+            self.values = [None] * len(row["values"])
+            self.overrides = [{} for _ in row["values"]]
+            # 第一列之前的形狀不同的列也要補上佔位
+            for _ in range(index):
+                self._append_placeholder()
+
+        if not self._regular(row, self._shape):
+            self.irregular[index] = row
+            if self._shape is not None:
+                self._append_placeholder()
+        else:
+            for dimension, part in enumerate(row["x"]):
+                self.codes[dimension].append(self._code(dimension, tuple(part)))
+            for column, value in enumerate(row["values"]):
+                self._append_value(column, value, index)
+
+        self._size += 1
+
+    @staticmethod
+    def _regular(row, shape):
+        if not (
+            isinstance(row, dict)
+            and row.keys() == {"x", "values"}
+            and isinstance(row["x"], list)
+            and isinstance(row["values"], list)
+            and all(isinstance(part, list) for part in row["x"])
+        ):
+            return False
+
+        try:
+            for part in row["x"]:
+                hash(tuple(part))
+        except TypeError:
+            return False
+
+        return shape is None or shape == (len(row["x"]), len(row["values"]))
+
+    def _code(self, dimension, label):
+        lookup = self._lookup[dimension]
+        if (code := lookup.get(label)) is None:
+            code = lookup[label] = len(self.labels[dimension])
+            self.labels[dimension].append(label)
+
+        return code
+
+    def _append_value(self, column, value, index):
+        if self.values[column] is None:
+            # 欄位型別由第一個非 null 值決定, 之前的 null 都記在 overrides
+            if value is None:
+                self.overrides[column][index] = value
+                return
+            self.values[column] = self._new_column(value, index)
+
+        values = self.values[column]
+        if not isinstance(values, array):
+            values.append(value)
+        elif values.typecode == "q" and type(value) is int and _fits(value):
+            values.append(value)
+        elif values.typecode == "d" and type(value) is float:
+            values.append(value)
+        else:
+            self.overrides[column][index] = value
+            values.append(0)
+
+    @staticmethod
+    def _new_column(value, index):
+        if type(value) is int and _fits(value):
+            column = array("q")
+        elif type(value) is float:
+            column = array("d")
+        else:
+            return [None] * index
+
+        column.extend([0] * index)
+        return column
+
+    def _append_placeholder(self):
+        for codes in self.codes:
+            codes.append(0)
+        for values in self.values:
+            if values is not None:
+                values.append(0 if isinstance(values, array) else None)
+
+    def iter_rows(self):
+        for index in range(self._size):
+            if index in self.irregular:
+                yield self.irregular[index]
+                continue
+
+            yield {
+                "x": [
+                    list(labels[codes[index]])
+                    for labels, codes in zip(self.labels, self.codes)
+                ],
+                "values": [
+                    overrides[index] if index in overrides else values[index]
+                    for values, overrides in zip(self.values, self.overrides)
+                ],
+            }
+
+    def to_rows(self):
+        """Rebuilds the original list of row dicts."""
+
+        return list(self.iter_rows())
+
+    def to_dict(self):
+        """
+        JSON-friendly columnar form, see `from_dict`.
+
+        Returns:
+            dict: `format`, `size`, `labels`, `codes`, `values`, `overrides` and `irregular`.
+        """
+
+        return {
+            "format": "columnar",
+            "size": self._size,
+            "labels": [[list(label) for label in labels] for labels in self.labels],
+            "codes": [codes.tolist() for codes in self.codes],
+            "values": [
+                values.tolist() if isinstance(values, array) else values
+                for values in self.values
+            ],
+            "overrides": [
+                {str(index): value for index, value in overrides.items()}
+                for overrides in self.overrides
+            ],
+            "irregular": {str(index): row for index, row in self.irregular.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columnar = cls()
+        columnar._size = data["size"]
+        columnar.labels = [
+            [tuple(label) for label in labels] for labels in data["labels"]
+        ]
+        columnar._lookup = [
+            {label: code for code, label in enumerate(labels)}
+            for labels in columnar.labels
+        ]
+        columnar.codes = [array("I", codes) for codes in data["codes"]]
+        columnar.values = [_packed(values) for values in data["values"]]
+        columnar.overrides = [
+            {int(index): value for index, value in overrides.items()}
+            for overrides in data["overrides"]
+        ]
+        columnar.irregular = {
+            int(index): row for index, row in data["irregular"].items()
+        }
+        if len(columnar.irregular) < columnar._size:
+            columnar._shape = (len(columnar.codes), len(columnar.values))
+
+        return columnar
+
+    def to_numpy(self):
+        """
+        Zero-copy NumPy views of the codes and packed value columns. Entries
+        listed in `overrides` or `irregular` hold placeholders (0) here.
+
+        Returns:
+            dict: `codes` (uint32 arrays per x dimension) and `values`
+                (int64/float64 arrays, object arrays for other columns).
+        """
+
+        import numpy as np
+
+        return {
+            "codes": [np.frombuffer(codes, dtype=np.uintc) for codes in self.codes],
+            "values": [
+                (
+                    np.frombuffer(
+                        values, dtype=np.int64 if values.typecode == "q" else np.float64
+                    )
+                    if isinstance(values, array)
+                    else np.array(
+                        [None] * self._size if values is None else values, dtype=object
+                    )
+                )
+                for values in self.values
+            ],
+        }
+
+
+def _fits(value):
+    return _int64[0] <= value < _int64[1]
+
+
+def _packed(values):
+    """Packs a decoded value column back into an array when it is homogeneous."""
+
+    if values and all(type(value) is int and _fits(value) for value in values):
+        return array("q", values)
+    if values and all(type(value) is float for value in values):
+        return array("d", values)
+
+    return values
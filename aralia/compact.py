@@ -0,0 +1,149 @@
+import logging
+
+from config import setting
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a prompt: about one token per CJK character and one
+    per four other characters. Good enough to budget prompts, not to bill them.
+    """
+
+    cjk = sum(1 for c in text if "\u3400" <= c <= "\u9fff" or "\uf900" <= c <= "\ufaff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _cell(value, limit=None):
+    text = " ".join(str(value if value is not None else "").split()).replace("|", "/")
+    if limit is not None and len(text) > limit:
+        text = text[:limit].rstrip() + "…" if limit else ""
+
+    return text
+
+
+def _table(header, rows):
+    return "\n".join(" | ".join(row) for row in [header, *rows])
+
+
+def _shrinking(limit):
+    """Description limits to try: `limit`, then halved down to 0."""
+
+    while limit > 0:
+        yield limit
+        limit //= 2
+    yield 0
+
+
+def compact_datasets(datasets, budget=None, description_chars=None):
+    """
+    Serializes search results as a `id | name | siteName | description` table.
+    Descriptions are cut to `description_chars`, and further halved while the
+    table exceeds `budget` tokens; the last datasets are dropped if even that
+    is not enough.
+
+    Args:
+        datasets (iterable): Datasets with `id`, `name`, `description` and `siteName`.
+        budget (int, optional): Token budget, defaults to `setting["prompt"]["datasets_budget"]`.
+        description_chars (int, optional): Defaults to `setting["prompt"]["description_chars"]`.
+
+    Returns:
+        tuple: `(text, tokens)`.
+    """
+
+    budget = budget or setting["prompt"]["datasets_budget"]
+    if description_chars is None:
+        description_chars = setting["prompt"]["description_chars"]
+    datasets = list(datasets)
+
+    def render(datasets, limit):
+        return _table(
+            ["id", "name", "siteName", "description"],
+            [
+                [
+                    _cell(dataset["id"]),
+                    _cell(dataset.get("name")),
+                    _cell(dataset.get("siteName")),
+                    _cell(dataset.get("description"), limit),
+                ]
+                for dataset in datasets
+            ],
+        )
+
+    for limit in _shrinking(description_chars):
+        text = render(datasets, limit)
+        if (tokens := estimate_tokens(text)) <= budget:
+            return text, tokens
+
+    while len(datasets) > 1 and tokens > budget:
+        datasets.pop()
+        text = render(datasets, 0)
+        tokens = estimate_tokens(text)
+
+    logger.warning(
+        "資料集清單超過 %d tokens 預算, 只保留前 %d 個", budget, len(datasets)
+    )
+    return text, tokens
+
+
+def compact_columns(datasets, budget=None, description_chars=None):
+    """
+    Serializes datasets with their columns: a header line per dataset followed
+    by a `columnID | displayName | type | description` table. Column and
+    dataset descriptions shrink like in `compact_datasets`; columns are never
+    dropped, since the model has to pick from all of them.
+
+    Args:
+        datasets (iterable): Datasets with `id`, `name`, `description` and
+            `columns` (a list or a dict keyed by columnID).
+        budget (int, optional): Token budget, defaults to `setting["prompt"]["columns_budget"]`.
+        description_chars (int, optional): Defaults to `setting["prompt"]["description_chars"]`.
+
+    Returns:
+        tuple: `(text, tokens)`.
+    """
+
+    budget = budget or setting["prompt"]["columns_budget"]
+    if description_chars is None:
+        description_chars = setting["prompt"]["description_chars"]
+    datasets = list(datasets)
+
+    def render(limit):
+        sections = []
+        for dataset in datasets:
+            columns = dataset["columns"]
+            if isinstance(columns, dict):
+                columns = columns.values()
+
+            sections.append(
+                f"## {_cell(dataset['id'])} | {_cell(dataset.get('name'))}"
+                + (
+                    f" | {description}"
+                    if (description := _cell(dataset.get("description"), limit))
+                    else ""
+                )
+                + "\n"
+                + _table(
+                    ["columnID", "displayName", "type", "description"],
+                    [
+                        [
+                            _cell(column["columnID"]),
+                            _cell(column.get("displayName")),
+                            _cell(column.get("type")),
+                            _cell(column.get("description"), limit),
+                        ]
+                        for column in columns
+                    ],
+                )
+            )
+
+        return "\n\n".join(sections)
+
+    for limit in _shrinking(description_chars):
+        text = render(limit)
+        if (tokens := estimate_tokens(text)) <= budget:
+            return text, tokens
+
+    logger.warning("欄位清單 %d tokens 超過 %d tokens 預算", tokens, budget)
+    return text, tokens
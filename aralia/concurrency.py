@@ -0,0 +1,45 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import setting
+
+
+def gather(calls, max_workers=None, timeout=None):
+    """
+    Runs zero-argument callables on a thread pool, the blocking counterpart of
+    `asyncio.gather(..., return_exceptions=True)`.
+
+    Args:
+        calls (list): Callables to run.
+        max_workers (int, optional): Thread cap, defaults to `setting["concurrency"]["max_workers"]`.
+        timeout (float, optional): Seconds to wait for all calls. Calls still
+            running by then get a `TimeoutError` and finish in the background.
+
+    Returns:
+        list: Results in the order of `calls`, a raised exception is returned in place of its result.
+    """
+
+    if not calls:
+        return []
+
+    max_workers = max_workers or setting["concurrency"]["max_workers"]
+
+    executor = ThreadPoolExecutor(max_workers=min(len(calls), max_workers))
+    try:
+        # 每個 thread 沿用呼叫端的 contextvars, 例如 metrics.count_calls
+        futures = [
+            executor.submit(contextvars.copy_context().run, call) for call in calls
+        ]
+        wait(futures, timeout=timeout)
+    finally:
+        # 逾時的呼叫不等它結束
+        executor.shutdown(wait=timeout is None, cancel_futures=True)
+
+    return [
+        (
+            (future.exception() or future.result())
+            if future.done() and not future.cancelled()
+            else TimeoutError(f"{timeout}s 內沒有完成")
+        )
+        for future in futures
+    ]
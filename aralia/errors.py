@@ -0,0 +1,30 @@
+class AraliaAPIError(RuntimeError):
+    """
+    An Aralia request that failed for good: a non-retryable status, retries
+    exhausted, or a response without `data`.
+
+    Attributes:
+        url (str): Request URL.
+        status (int or None): HTTP status, `None` when no response arrived.
+        code (str or None): Error code from the response body, if any.
+    """
+
+    def __init__(self, message, url=None, status=None, code=None):
+        super().__init__(message)
+        self.url = url
+        self.status = status
+        self.code = code
+
+    @classmethod
+    def from_response(cls, method, url, status, body):
+        code = body.get("code") if isinstance(body, dict) else None
+        return cls(
+            f"{method} {url} 失敗: HTTP {status}" + (f" {code}" if code else ""),
+            url=url,
+            status=status,
+            code=code,
+        )
+
+
+class CircuitOpenError(AraliaAPIError):
+    """The host failed repeatedly and is not being called until its breaker resets."""
@@ -0,0 +1,122 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def explore_url(chart, start=0, page_size=50):
+    return (
+        chart["sourceURL"]
+        + "/api/exploration/"
+        + chart["id"]
+        + f"?start={start}&pageSize={page_size}"
+    )
+
+
+def page_rows(data):
+    """
+    Splits an exploration response into its rows and `recordsFiltered`.
+
+    Returns:
+        tuple: `(rows, total)`, `total` is `None` when the server sends no pageInfo.
+    """
+
+    return data.get("list") or [], (data.get("pageInfo") or {}).get("recordsFiltered")
+
+
+def has_more(rows, start, total, page_size):
+    """Whether another page follows one with `rows` rows ending at offset `start`."""
+
+    if not rows:
+        return False
+
+    if total is not None:
+        return start < total
+
+    return rows >= page_size
+
+
+def take_rows(pages, max_rows, rows=None):
+    """
+    Accumulates rows from a page generator, consuming no more pages than needed
+    for `max_rows` rows.
+
+    Args:
+        pages (generator): Page generator, see `iter_explore_pages`.
+        max_rows (int): Maximum number of rows to keep.
+        rows (list or ColumnarRows, optional): Container to accumulate into, a new list by default.
+
+    Returns:
+        tuple: `(rows, truncated)`, `truncated` is `True` when rows were left out.
+    """
+
+    rows = [] if rows is None else rows
+    truncated = False
+
+    try:
+        for page in pages:
+            remaining = max_rows - len(rows)
+            rows.extend(page[:remaining])
+            if len(rows) >= max_rows:
+                # 下一頁已經在預先抓取, 看一下就知道是否還有資料
+                truncated = len(page) > remaining or next(pages, None) is not None
+                break
+    finally:
+        pages.close()
+
+    return rows, truncated
+
+
+async def atake_rows(pages, max_rows, rows=None):
+    """Async counterpart of `take_rows` for an async page generator."""
+
+    rows = [] if rows is None else rows
+    truncated = False
+
+    try:
+        async for page in pages:
+            remaining = max_rows - len(rows)
+            rows.extend(page[:remaining])
+            if len(rows) >= max_rows:
+                truncated = (
+                    len(page) > remaining or await anext(pages, None) is not None
+                )
+                break
+    finally:
+        await pages.aclose()
+
+    return rows, truncated
+
+
+def single_page_rows(rows, total, max_rows):
+    """
+    Cuts a single page requested with `max_rows + 1` rows down to `max_rows`.
+
+    Returns:
+        tuple: `(rows, truncated)`, see `take_rows`.
+    """
+
+    return rows[:max_rows], len(rows) > max_rows or (total or 0) > max_rows
+
+
+def set_explore_result(chart, response, truncated=False):
+    """
+    Writes one chart's exploration result back into the chart in place.
+
+    Args:
+        chart (dict): Chart that was sent as the exploration request.
+        response (list, ColumnarRows or Exception): Response rows, or the exception the request raised.
+        truncated (bool, optional): Rows beyond `max_rows` were left out.
+    """
+
+    if isinstance(response, Exception):
+        logger.warning("無法取得圖表 %s 的資料: %r", chart["id"], response)
+        chart["data"] = None
+        chart["error"] = repr(response)
+    else:
+        chart["data"] = response
+        chart.pop("error", None)
+
+    if truncated:
+        chart["truncated"] = True
+    else:
+        chart.pop("truncated", None)
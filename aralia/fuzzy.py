@@ -0,0 +1,111 @@
+import math
+from collections import defaultdict
+from functools import lru_cache
+
+from .cache import normalize_keyword
+
+
+def ngrams(text, sizes=(2, 3)):
+    """
+    Character n-grams of the normalized text (NFKC, case folded). CJK has no
+    word boundaries, so the whole string is cut regardless of script; texts
+    shorter than the smallest size are kept as a single gram.
+    """
+
+    text = normalize_keyword(str(text))
+    grams = {text[i : i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+    return grams or ({text} if text else set())
+
+
+class CandidateIndex:
+    """
+    Inverted character n-gram index over the candidate values of one filter
+    column, used to hand the LLM the few values a question refers to instead
+    of the whole list.
+
+    A value scores by how much of it the query covers: the idf-weighted share
+    of its n-grams that also occur in the query. 士林 scores 1 against
+    「士林站的出站人數」 while 士林區 only partly matches.
+
+    Args:
+        values (list): Candidate values, in the server's order.
+        sizes (tuple, optional): n-gram lengths to index.
+    """
+
+    def __init__(self, values, sizes=(2, 3)):
+        self.values = list(values)
+        self.sizes = sizes
+
+        self._postings = defaultdict(list)
+        value_grams = [ngrams(value, sizes) for value in self.values]
+        for i, grams in enumerate(value_grams):
+            for gram in grams:
+                self._postings[gram].append(i)
+
+        self._idf = {
+            gram: math.log(1 + len(self.values) / len(postings))
+            for gram, postings in self._postings.items()
+        }
+        self._weights = [
+            sum(self._idf[gram] for gram in grams) for grams in value_grams
+        ]
+
+    def search(self, query, k=50):
+        """
+        Returns:
+            list: `(value, score)` of the at most `k` best matching values,
+                best first, ties in the original order.
+        """
+
+        scores = defaultdict(float)
+        for gram in ngrams(query, self.sizes):
+            for i in self._postings.get(gram, ()):
+                scores[i] += self._idf[gram]
+
+        ranked = sorted(scores, key=lambda i: (-scores[i] / self._weights[i], i))
+
+        return [(self.values[i], scores[i] / self._weights[i]) for i in ranked[:k]]
+
+    def preselect(self, query, k=50):
+        """
+        Keeps at most `k` values: the ones matching `query` first, topped up
+        with the remaining values in their original order so that columns the
+        question does not mention still get a sample.
+        """
+
+        if len(self.values) <= k:
+            return list(self.values)
+
+        selected = [value for value, _ in self.search(query, k)]
+        if len(selected) < k:
+            chosen = set(selected)
+            selected += [value for value in self.values if value not in chosen][
+                : k - len(selected)
+            ]
+
+        return selected
+
+
+@lru_cache(maxsize=32)
+def candidate_index(values):
+    """`CandidateIndex` of a tuple of values, reused while the column's values stay the same."""
+
+    return CandidateIndex(values)
+
+
+def preselect_candidates(records, question, k):
+    """
+    Trims the `values` of filter-options records to the top-`k` candidates
+    for `question`, see `CandidateIndex.preselect`. Each trimmed record gets
+    `candidates`, the number of values before trimming.
+    """
+
+    for record in records:
+        if len(record["values"]) > k:
+            record["candidates"] = len(record["values"])
+            record["values"] = candidate_index(tuple(record["values"])).preselect(
+                question, k
+            )
+
+    return records
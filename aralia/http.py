@@ -0,0 +1,119 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import setting
+
+from .codec import ACCEPT_ENCODING
+
+
+class SessionPool:
+    """
+    Keeps one keep-alive `requests.Session` per Aralia host, so repeated calls to
+    the same planet reuse their TCP/TLS connections instead of handshaking again.
+
+    Args:
+        pool_connections (int): Number of connection pools cached per host session.
+        pool_maxsize (int): Maximum number of keep-alive connections kept per host.
+        per_host_limit (int): Maximum number of in-flight requests per host.
+        keep_alive (bool): Send `Connection: close` when disabled.
+        connect_timeout (float): Seconds to wait for a connection, unless a request passes `timeout`.
+        read_timeout (float): Seconds to wait for response data, unless a request passes `timeout`.
+        compress (bool): Ask for gzip (and brotli, when installed) compressed responses.
+    """
+
+    def __init__(
+        self,
+        pool_connections=10,
+        pool_maxsize=10,
+        per_host_limit=10,
+        keep_alive=True,
+        connect_timeout=5,
+        read_timeout=60,
+        compress=True,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.per_host_limit = per_host_limit
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress = compress
+
+        self._sessions = {}
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url) -> requests.Session:
+        host = self.host(url)
+
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                if not self.keep_alive:
+                    session.headers["Connection"] = "close"
+                session.headers["Accept-Encoding"] = (
+                    ACCEPT_ENCODING if self.compress else "identity"
+                )
+
+                self._sessions[host] = session
+                self._limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+
+            return self._sessions[host]
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        session = self.session(url)
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self._limits[self.host(url)]:
+            return session.request(method, url, **kwargs)
+
+    def stats(self):
+        """
+        Connection counters per host. `reused` is the number of requests that did
+        not need a new connection, i.e. the handshakes saved by keep-alive.
+        """
+
+        with self._lock:
+            sessions = dict(self._sessions)
+
+        stats = {}
+        for host, session in sessions.items():
+            requests_count = connections = 0
+            for adapter in {id(a): a for a in session.adapters.values()}.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    if pool := pools.get(key):
+                        requests_count += pool.num_requests
+                        connections += pool.num_connections
+
+            stats[host] = {
+                "requests": requests_count,
+                "connections": connections,
+                "reused": requests_count - connections,
+            }
+
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._limits.clear()
+
+
+# 所有 AraliaTools 共用同一組連線
+default_pool = SessionPool(**setting["http"])
@@ -0,0 +1,170 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+cols_exclude = [
+    "id",
+    "name",
+    "datasetID",
+    "visible",
+    "ordinalPosition",
+    "sortingSettingID",
+]
+virtual_exclude = [
+    "id",
+    "name",
+    "datasetID",
+    "visible",
+    "setting",
+    "sourceType",
+    "language",
+    "country",
+]
+
+
+class _NotModified:
+    # 合併的 request 會複製結果, sentinel 複製後仍要是同一個物件
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return "NOT_MODIFIED"
+
+
+# 304 Not Modified, 沿用快取的內容
+NOT_MODIFIED = _NotModified()
+
+
+def columns_url(dataset):
+    return f"{dataset['sourceURL']}/api/dataset/{dataset['id']}"
+
+
+def metadata_key(username, dataset):
+    # 各帳號可見的欄位可能不同, 快取依帳號分開
+    return f"{username}\t{columns_url(dataset)}"
+
+
+def project_dataset_columns(column_metadata):
+    """Projects the visible, typed columns of an `/api/dataset/{id}` response."""
+
+    return [
+        {
+            **{"columnID": column["id"]},
+            **{k: v for k, v in column.items() if k not in cols_exclude},
+        }
+        for column in column_metadata["columns"]
+        if column["type"] != "undefined" and column["visible"]
+    ]
+
+
+def project_virtual_variables(virtual_vars):
+    """Projects an `/api/dataset/{id}/virtual-variables` response."""
+
+    return [
+        {
+            "columnID": var["id"],
+            **{k: v for k, v in var.items() if k not in virtual_exclude},
+        }
+        for var in virtual_vars or []
+    ]
+
+
+def project_columns(column_metadata, virtual_vars=None):
+    """
+    Projects `/api/dataset/{id}` columns and `/virtual-variables` into the column
+    dicts handed to the LLM.
+
+    Args:
+        column_metadata (dict): Response of `/api/dataset/{id}`.
+        virtual_vars (list, optional): Response of `/api/dataset/{id}/virtual-variables`.
+
+    Returns:
+        list: Column dicts, dataset columns followed by virtual variables.
+    """
+
+    return project_dataset_columns(column_metadata) + project_virtual_variables(
+        virtual_vars
+    )
+
+
+def cached_columns(cache, username, datasets):
+    """
+    Looks every dataset up in `username`'s entries of the metadata cache.
+
+    Returns:
+        list: `(entry, fresh)` per dataset, `(None, False)` when it is not cached.
+    """
+
+    return [
+        cache.get(metadata_key(username, dataset)) or (None, False)
+        for dataset in datasets
+    ]
+
+
+def collect_columns(cache, username, dataset, entry, column_response, virtual_response):
+    """
+    Combines the two concurrently fetched responses of one dataset with its
+    stale cache entry and writes the result back to the cache.
+
+    Args:
+        cache (DiskCache): Metadata cache.
+        username (str): Account the responses were fetched with.
+        dataset (dict): Dataset with `sourceURL` and `id`.
+        entry (dict or None): Stale cache entry the requests revalidated.
+        column_response, virtual_response: `(data, etag)` of each GET, `data` is
+            `NOT_MODIFIED` on 304, or the exception the request raised.
+
+    Returns:
+        list or None: Projected columns, `None` when the dataset itself failed.
+    """
+
+    key = metadata_key(username, dataset)
+
+    if isinstance(column_response, Exception):
+        if entry is not None:
+            logger.warning(
+                "無法更新資料集 %s 的欄位, 沿用快取: %r", dataset["id"], column_response
+            )
+            return entry["columns"] + entry["virtual"]
+
+        logger.warning("無法取得資料集 %s 的欄位: %r", dataset["id"], column_response)
+        return None
+
+    column_metadata, columns_etag = column_response
+    if column_metadata is NOT_MODIFIED:
+        columns = entry["columns"]
+    elif not column_metadata:
+        cache.delete(key)
+        return None
+    else:
+        columns = project_dataset_columns(column_metadata)
+
+    if isinstance(virtual_response, Exception):
+        # 虛擬變數失敗時不寫入快取, 下次再重抓
+        logger.warning(
+            "無法取得資料集 %s 的虛擬變數: %r", dataset["id"], virtual_response
+        )
+        return columns + (entry["virtual"] if entry is not None else [])
+
+    virtual_vars, virtual_etag = virtual_response
+    if virtual_vars is NOT_MODIFIED:
+        virtual = entry["virtual"]
+    else:
+        virtual = project_virtual_variables(virtual_vars)
+
+    if column_metadata is NOT_MODIFIED and virtual_vars is NOT_MODIFIED:
+        cache.touch(key)
+    else:
+        cache.set(
+            key,
+            {
+                "columns": columns,
+                "virtual": virtual,
+                "etags": {"columns": columns_etag, "virtual": virtual_etag},
+            },
+        )
+
+    return columns + virtual
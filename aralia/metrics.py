@@ -0,0 +1,385 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from config import setting
+
+_calls = contextvars.ContextVar("aralia_calls", default=None)
+_trace = contextvars.ContextVar("aralia_trace", default=None)
+_lock = threading.Lock()
+
+
+def endpoint(url):
+    """Kind of Aralia API call: `search`, `metadata`, `filter_options`, `exploration` or `other`."""
+
+    path = urlsplit(url).path
+    if path.endswith("/filter-options"):
+        return "filter_options"
+    if "/api/exploration/" in path:
+        return "exploration"
+    if "/api/dataset/" in path:
+        return "metadata"
+    if "/api/galaxy/" in path:
+        return "search"
+
+    return "other"
+
+
+@contextmanager
+def count_calls():
+    """
+    Counts the HTTP requests Aralia clients send inside the block, per
+    `endpoint` kind plus `requests` (all of them), `retries` and `login`.
+    Calls answered from a cache or coalesced with another caller's request
+    are not counted.
+
+    The counter follows the context: asyncio tasks and the threads started by
+    `aralia.concurrency.gather` count into it, concurrent blocks do not mix.
+
+    Yields:
+        Counter: Filled in while the block runs.
+    """
+
+    calls = Counter()
+    token = _calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _calls.reset(token)
+
+
+def record_call(kind):
+    if (calls := _calls.get()) is not None:
+        with _lock:
+            calls[kind] += 1
+            if kind not in ("login", "retries"):
+                calls["requests"] += 1
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram, cumulative like a Prometheus histogram.
+
+    Args:
+        buckets (list): Upper bounds in seconds, ascending; `+Inf` is implied.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """`(upper bound, observations <= bound)` per bucket, ending with `+Inf`."""
+
+        total = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the `q` quantile, `None` when empty."""
+
+        if not self.count:
+            return None
+
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+
+
+class Span:
+    """
+    One timed operation: a graph node, an Aralia request, an LLM call or a
+    retry wait. `attrs` are kept with the span in its trace, `counts` (e.g.
+    tokens) are also summed per `(kind, name)` in the registry.
+    """
+
+    def __init__(self, kind, name, **attrs):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.counts = {}
+        self.error = None
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.trace = _trace.get()
+
+    def end(self, error=None):
+        if self.seconds is not None:
+            return
+
+        self.seconds = time.perf_counter() - self.start
+        if error is not None:
+            self.error = error if isinstance(error, str) else repr(error)
+
+        registry.observe(self)
+        if self.trace is not None:
+            self.trace.add(self)
+
+    def to_dict(self, origin=None):
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "start": round(self.start - (origin or self.start), 4),
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "error": self.error,
+            **({"attrs": self.attrs} if self.attrs else {}),
+            **({"counts": self.counts} if self.counts else {}),
+        }
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """
+    Times the block as a `Span`, recorded in the registry and in the current
+    trace. An exception escaping the block marks the span as failed.
+
+    Yields:
+        Span: Set `error`, `attrs` or `counts` on it inside the block.
+    """
+
+    current = Span(kind, name, **attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+
+
+def timed(kind, name=None):
+    """Decorator recording every call of a sync or async function as a span."""
+
+    def decorate(function):
+        label = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with span(kind, label):
+                    return await function(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with span(kind, label):
+                    return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class Trace:
+    """
+    Spans of one request, e.g. one question through the graph. Keeps at most
+    `max_spans` of them; the rest are only counted in `dropped`.
+    """
+
+    def __init__(self, max_spans=None):
+        self.max_spans = max_spans or setting["metrics"]["max_spans"]
+        self.start = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def summary(self):
+        """`{kind: {name: {"count", "seconds", "errors", **counts}}}` of the finished spans."""
+
+        summary = {}
+        with self._lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            stats = summary.setdefault(span.kind, {}).setdefault(
+                span.name, {"count": 0, "seconds": 0.0, "errors": 0}
+            )
+            stats["count"] += 1
+            stats["seconds"] = round(stats["seconds"] + span.seconds, 4)
+            stats["errors"] += span.error is not None
+            for key, value in span.counts.items():
+                stats[key] = stats.get(key, 0) + value
+
+        return summary
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+
+        return {
+            "elapsed": round(time.perf_counter() - self.start, 4),
+            "spans": [span.to_dict(self.start) for span in spans],
+            "dropped": self.dropped,
+        }
+
+    def report(self):
+        """Human-readable timeline, one line per span."""
+
+        lines = []
+        for span in self.to_dict()["spans"]:
+            lines.append(
+                f"{span['start']:8.3f}s {span['seconds']:8.3f}s  "
+                f"{span['kind']:<6} {span['name']}"
+                + (f"  ! {span['error']}" if span["error"] else "")
+            )
+
+        return "\n".join(lines)
+
+
+@contextmanager
+def trace(max_spans=None):
+    """
+    Collects the spans recorded inside the block, including those of asyncio
+    tasks and `gather` threads started from it. Joins the enclosing trace
+    when there is one, so the outermost caller sees every span.
+
+    Yields:
+        Trace
+    """
+
+    if (current := _trace.get()) is not None:
+        yield current
+        return
+
+    current = Trace(max_spans)
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+
+
+class Registry:
+    """
+    Process-wide aggregation of every span: a latency histogram, an error
+    count and the summed `counts` per `(kind, name)`.
+
+    Args:
+        buckets (list, optional): Histogram bounds, defaults to `setting["metrics"]["buckets"]`.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or setting["metrics"]["buckets"]
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span):
+        with self._lock:
+            if (series := self._series.get((span.kind, span.name))) is None:
+                series = self._series[(span.kind, span.name)] = {
+                    "histogram": Histogram(self.buckets),
+                    "errors": 0,
+                    "counts": Counter(),
+                }
+
+            series["histogram"].observe(span.seconds)
+            series["errors"] += span.error is not None
+            series["counts"].update(span.counts)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def to_json(self):
+        """`{kind: {name: {count, sum, errors, p50, p95, p99, buckets, **counts}}}`."""
+
+        with self._lock:
+            series = {
+                key: (value["histogram"], value["errors"], dict(value["counts"]))
+                for key, value in self._series.items()
+            }
+
+        result = {}
+        for (kind, name), (histogram, errors, counts) in sorted(series.items()):
+            result.setdefault(kind, {})[name] = {
+                "count": histogram.count,
+                "sum": round(histogram.sum, 4),
+                "errors": errors,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+                "buckets": {
+                    _bound(bound): total for bound, total in histogram.cumulative()
+                },
+                **counts,
+            }
+
+        return result
+
+    def to_prometheus(self, prefix="aralia"):
+        """Prometheus text exposition format (version 0.0.4)."""
+
+        with self._lock:
+            series = sorted(
+                (key, value["histogram"], value["errors"], dict(value["counts"]))
+                for key, value in self._series.items()
+            )
+
+        lines = [
+            f"# HELP {prefix}_span_seconds Latency of graph nodes, Aralia requests, filter columns, LLM calls, retry waits and MCP tools.",
+            f"# TYPE {prefix}_span_seconds histogram",
+        ]
+        for (kind, name), histogram, _, _ in series:
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+            for bound, total in histogram.cumulative():
+                lines.append(
+                    f'{prefix}_span_seconds_bucket{{{labels},le="{_bound(bound)}"}} {total}'
+                )
+            lines.append(f"{prefix}_span_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{prefix}_span_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            f"# HELP {prefix}_span_errors_total Spans that ended with an error.",
+            f"# TYPE {prefix}_span_errors_total counter",
+        ]
+        for (kind, name), _, errors, _ in series:
+            lines.append(
+                f'{prefix}_span_errors_total{{kind="{_escape(kind)}",name="{_escape(name)}"}} {errors}'
+            )
+
+        for key in sorted({key for *_, counts in series for key in counts}):
+            metric = f"{prefix}_{key}_total"
+            lines += [f"# TYPE {metric} counter"]
+            for (kind, name), _, _, counts in series:
+                if key in counts:
+                    lines.append(
+                        f'{metric}{{kind="{_escape(kind)}",name="{_escape(name)}"}} {counts[key]}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+def _bound(bound):
+    return "+Inf" if bound == float("inf") else f"{bound:g}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# 整個 process 共用, MCP server 與 AssistantGraph 都從這裡匯出
+registry = Registry()
@@ -0,0 +1,200 @@
+import logging
+import re
+import time
+import unicodedata
+from urllib.parse import urlencode
+
+from .cache import normalize_keyword
+from .metrics import Span
+
+logger = logging.getLogger(__name__)
+
+
+# 從問題擷取關鍵字時當作分隔的常見詞
+_stopwords = re.compile(
+    r"請|分別|說明|各自|列出|提供|哪個|哪種|哪些|多少|平均|期間|以及|的|與|和|及|在|到|或|、"
+)
+_latin_stopwords = {
+    "a", "an", "and", "are", "average", "between", "by", "compared", "each", "for",
+    "from", "how", "in", "is", "many", "much", "of", "on", "or", "the", "their",
+    "to", "what", "which", "with",
+}  # fmt: skip
+_cjk = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_terms = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]{2,}|[A-Za-z\u00c0-\u024f]{2,}")
+
+
+def filter_options_url(dataset, start=0, page_size=1000, keyword=None):
+    url = (
+        dataset["sourceURL"]
+        + "/api/exploration/"
+        + dataset["id"]
+        + f"/filter-options?start={start}&pageSize={page_size}"
+    )
+
+    if keyword:
+        url += "&" + urlencode({"keyword": keyword})
+
+    return url
+
+
+def option_values(rows):
+    return [item["x"][0][0] for item in rows]
+
+
+def question_keywords(question, max_keywords=8):
+    """
+    Heuristically extracts search terms from a question: CJK runs and Latin
+    words of at least two characters, split at common function words.
+
+    Returns:
+        list: Distinct terms in order of appearance, at most `max_keywords`.
+    """
+
+    text = _stopwords.sub(" ", unicodedata.normalize("NFKC", question))
+    keywords = [
+        term
+        for term in dict.fromkeys(_terms.findall(text))
+        if term.casefold() not in _latin_stopwords
+    ]
+
+    return keywords[:max_keywords]
+
+
+def search_terms(keywords):
+    """
+    Terms sent as the server-side `keyword` of filter-options. CJK terms are cut
+    to their first two characters, since question phrases like 士林站 are often
+    longer than the values (士林) they refer to.
+    """
+
+    return list(
+        dict.fromkeys(
+            keyword[:2] if _cjk.match(keyword) else keyword for keyword in keywords
+        )
+    )
+
+
+def narrow_values(values, keywords):
+    """Keeps the values that contain, or are contained in, one of the keywords."""
+
+    folded = [normalize_keyword(keyword) for keyword in keywords]
+
+    return [
+        value
+        for value in values
+        if (text := normalize_keyword(str(value)))
+        and any(keyword in text or text in keyword for keyword in folded)
+    ]
+
+
+def filter_options_key(username, dataset, filter_column):
+    return (
+        username,
+        dataset["sourceURL"],
+        dataset["id"],
+        filter_column["columnID"],
+        filter_column.get("format") or "",
+    )
+
+
+def filter_options_record(
+    dataset, filter_column, values, start, cached=False, narrowed=False, total=None
+):
+    """
+    Builds the timing record of one filter column's candidate enumeration and
+    records it as a `filter_options` span named `cached`, `narrowed` or
+    `fetched`, so its latency and error also show up in the metrics.
+
+    Args:
+        dataset (dict): Dataset the filter belongs to.
+        filter_column (dict): Filter column sent as `x`.
+        values (list or Exception): Candidate values, or the exception the requests raised.
+        start (float): `time.perf_counter()` taken before the first request.
+        cached (bool, optional): Values came from the filter-options cache.
+        narrowed (bool, optional): Values were narrowed down by question keywords.
+        total (int, optional): Number of distinct values the server reported.
+
+    Returns:
+        dict: `id`, `columnID`, `values`, `elapsed` (seconds), `error`, `cached`,
+            `narrowed` and `truncated`.
+    """
+
+    record = {
+        "id": dataset["id"],
+        "columnID": filter_column["columnID"],
+        "values": [],
+        "elapsed": time.perf_counter() - start,
+        "error": None,
+        "cached": cached,
+        "narrowed": narrowed,
+        "truncated": False,
+    }
+
+    if isinstance(values, Exception):
+        logger.warning(
+            "無法取得 %s 欄位 %s 的篩選值: %r",
+            dataset["id"],
+            filter_column["columnID"],
+            values,
+        )
+        record["error"] = repr(values)
+    else:
+        record["values"] = list(values)
+        record["truncated"] = not narrowed and total is not None and total > len(values)
+
+    _record_span(record)
+
+    return record
+
+
+def _record_span(record):
+    timing = Span(
+        "filter_options",
+        (
+            "cached"
+            if record["cached"]
+            else "narrowed" if record["narrowed"] else "fetched"
+        ),
+        id=record["id"],
+        columnID=record["columnID"],
+        values=len(record["values"]),
+        truncated=record["truncated"],
+    )
+    # 欄位已經查完, 把起點往回推到開始列舉的時間
+    timing.start -= record["elapsed"]
+    timing.end(record["error"])
+
+
+def warm_up_targets(datasets, columns, space_formats):
+    """
+    Lists the filter columns whose candidates are worth preloading: every
+    nominal column, and every space column in each of `space_formats`.
+
+    Args:
+        datasets (list): Datasets with `sourceURL` and `id`.
+        columns (list): Projected columns per dataset, `None` for a failed dataset.
+        space_formats (list): admin_level formats to preload for space columns.
+
+    Returns:
+        list: Datasets shaped for `fetch_filter_options`.
+    """
+
+    targets = []
+    for dataset, dataset_columns in zip(datasets, columns):
+        filters = []
+        for column in dataset_columns or []:
+            if column["type"] == "nominal":
+                filters.append({**column, "format": ""})
+            elif column["type"] == "space":
+                filters += [{**column, "format": f} for f in space_formats]
+
+        if filters:
+            targets.append(
+                {
+                    "sourceURL": dataset["sourceURL"],
+                    "id": dataset["id"],
+                    "filter": filters,
+                }
+            )
+
+    return targets
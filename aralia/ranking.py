@@ -0,0 +1,104 @@
+import math
+import re
+from collections import Counter
+
+from .cache import normalize_keyword
+
+_tokens = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9\u00c0-\u024f]+")
+_cjk = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text):
+    """
+    Splits text into BM25 terms: CJK runs become overlapping character bigrams
+    (a lone character stays a unigram), Latin words and numbers stay whole.
+    Text is NFKC-normalized and case folded first.
+    """
+
+    terms = []
+    for token in _tokens.findall(normalize_keyword(text or "")):
+        if _cjk.match(token) and len(token) > 1:
+            terms += [token[i : i + 2] for i in range(len(token) - 1)]
+        else:
+            terms.append(token)
+
+    return terms
+
+
+class BM25:
+    """
+    Okapi BM25 over a fixed list of documents.
+
+    Args:
+        documents (list): Term lists, see `tokenize`.
+        k1 (float, optional): Term frequency saturation.
+        b (float, optional): Document length normalization.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+
+        document_frequency = Counter(
+            term for frequencies in self.frequencies for term in frequencies
+        )
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query):
+        terms = [term for term in set(query) if term in self.idf]
+        scores = []
+        for frequencies, length in zip(self.frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            scores.append(
+                sum(
+                    self.idf[term]
+                    * frequencies[term]
+                    * (self.k1 + 1)
+                    / (frequencies[term] + norm)
+                    for term in terms
+                    if term in frequencies
+                )
+            )
+
+        return scores
+
+
+def rank_datasets(question, datasets, top_k=None, fields=None):
+    """
+    Ranks search results against the question with BM25. Fields are weighted
+    by repeating their terms, ties keep the search order.
+
+    Args:
+        question (str): User question.
+        datasets (list): Datasets with `name`, `description` and `siteName`.
+        top_k (int, optional): Number of datasets to keep, all by default.
+        fields (dict, optional): Weight per field, defaults to name 2, description 1, siteName 1.
+
+    Returns:
+        list: `(dataset, score)`, best first.
+    """
+
+    fields = fields or {"name": 2, "description": 1, "siteName": 1}
+    datasets = list(datasets)
+
+    bm25 = BM25(
+        [
+            [
+                term
+                for field, weight in fields.items()
+                for term in tokenize(dataset.get(field)) * weight
+            ]
+            for dataset in datasets
+        ]
+    )
+    scores = bm25.scores(tokenize(question))
+
+    ranked = sorted(range(len(datasets)), key=lambda i: (-scores[i], i))
+    return [(datasets[i], scores[i]) for i in ranked[:top_k]]
@@ -0,0 +1,47 @@
+import random
+
+from .codec import loads
+from .errors import AraliaAPIError
+
+# 暫時性錯誤, 等一下重送通常就會成功
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def backoff_delay(attempt, base, cap, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based): exponential
+    backoff with full jitter, or the server's `Retry-After` when it sent one.
+    Both are capped at `cap`.
+    """
+
+    if retry_after is not None:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def response_body(response):
+    """The decoded JSON body of a (possibly compressed) response, `None` when it is not JSON."""
+
+    try:
+        return loads(response.content)
+    except ValueError:
+        return None
+
+
+def response_data(method, url, response):
+    """
+    The `data` of an Aralia response.
+
+    Raises:
+        AraliaAPIError: The response has no `data`, e.g. an error body.
+    """
+
+    body = response_body(response)
+    if not isinstance(body, dict) or body.get("data") is None:
+        raise AraliaAPIError.from_response(method, url, response.status_code, body)
+
+    return body["data"]
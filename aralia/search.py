@@ -0,0 +1,39 @@
+import logging
+from itertools import zip_longest
+
+logger = logging.getLogger(__name__)
+
+
+def galaxy_search_url(galaxy):
+    return galaxy + "/galaxy/dataset"
+
+
+def merge_search_results(galaxies, responses, max_results=None):
+    """
+    Merges the search results of several galaxies. Results are interleaved
+    rank by rank, so every galaxy's best matches come first, and a dataset
+    listed by more than one galaxy is kept once (first occurrence).
+
+    Args:
+        galaxies (list): Galaxy URLs, in the order of `responses`.
+        responses (list): Result list of each galaxy, or the exception its search raised.
+        max_results (int, optional): Number of merged results to keep, all by default.
+
+    Returns:
+        list: Merged search results.
+    """
+
+    results = []
+    for galaxy, response in zip(galaxies, responses):
+        if isinstance(response, Exception):
+            logger.warning("搜尋 %s 失敗, 略過這個星系: %r", galaxy, response)
+        else:
+            results.append(response or [])
+
+    merged = {}
+    for rank in zip_longest(*results):
+        for dataset in rank:
+            if dataset is not None:
+                merged.setdefault(dataset["id"], dataset)
+
+    return list(merged.values())[:max_results]
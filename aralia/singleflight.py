@@ -0,0 +1,133 @@
+import asyncio
+import copy
+import json
+import threading
+import weakref
+
+
+def request_key(*parts, **kwargs):
+    """
+    Canonical key of a request: JSON with sorted keys, so bodies that differ
+    only in key order map to the same in-flight call.
+    """
+
+    return json.dumps(
+        [parts, kwargs],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller of a key runs it,
+    callers arriving while it is in flight wait and get a deep copy of its
+    result (or its exception). Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "requests": 0, "collapsed": 0}
+
+    def do(self, key, call):
+        with self._lock:
+            self._stats["calls"] += 1
+            if flight := self._flights.get(key):
+                flight.followers += 1
+                self._stats["collapsed"] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self._stats["requests"] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = call()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        # 有人共用結果時 leader 也拿副本, 避免改到其他人要複製的原始資料
+        return copy.deepcopy(flight.result) if flight.followers else flight.result
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of `SingleFlight`. The call runs as its own task, so a
+    caller being cancelled does not cancel the request the others wait for.
+
+    Tasks belong to one event loop, so calls are only coalesced with callers on
+    the same running loop; every loop (e.g. one per thread) has its own table.
+    """
+
+    def __init__(self):
+        self._flights = weakref.WeakKeyDictionary()  # loop -> {key: (task, followers)}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "requests": 0, "collapsed": 0}
+
+    async def do(self, key, call):
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            self._stats["calls"] += 1
+            flights = self._flights.setdefault(loop, {})
+
+            if (flight := flights.get(key)) is not None:
+                task, followers = flight
+                followers.append(None)
+                self._stats["collapsed"] += 1
+                leader = False
+            else:
+                task = loop.create_task(call())
+                followers = []
+                flights[key] = (task, followers)
+                self._stats["requests"] += 1
+                leader = True
+
+        if not leader:
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task.add_done_callback(lambda _: self._done(loop, key))
+
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result) if followers else result
+
+    def _done(self, loop, key):
+        with self._lock:
+            if (flights := self._flights.get(loop)) is not None:
+                flights.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(len(flights) for flights in self._flights.values())
+            return {**self._stats, "in_flight": in_flight}
+
+
+# 所有 AraliaTools 共用, 不同 client 同時送出的相同 request 也會合併
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
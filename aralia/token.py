@@ -0,0 +1,213 @@
+import base64
+import json
+import logging
+import threading
+import time
+
+from config import setting
+from .errors import AraliaAPIError
+from .http import SessionPool, default_pool
+from .metrics import record_call, span
+from .retry import response_data
+
+logger = logging.getLogger(__name__)
+
+
+def jwt_expiry(token):
+    """
+    Reads the `exp` claim of a JWT without verifying it.
+
+    Returns:
+        float or None: Expiry as a unix timestamp, `None` when the token carries none.
+    """
+
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+# refresh() 沒有指定 stale 時一律重新登入
+_FORCE = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class TokenManager:
+    """
+    Owns the access token of one Aralia account.
+
+    The token is refreshed in a background thread once it is within
+    `refresh_margin` seconds of its JWT expiry, so requests keep using the
+    still-valid token meanwhile. Concurrent refreshes (cold start, a burst of
+    401s) are coalesced into a single login call.
+
+    Args:
+        username (str): Aralia account.
+        password (str): Aralia password.
+        pool (SessionPool, optional): Connection pool used for the login call.
+        refresh_margin (float, optional): Seconds before expiry to refresh in the background.
+        default_ttl (float, optional): Lifetime assumed for tokens without `exp`, `None` to refresh only on 401.
+    """
+
+    login_url = "https://xwckbycddv4zlzeslemvhoh6sa0xoxcc.lambda-url.ap-southeast-1.on.aws/"
+
+    def __init__(
+        self,
+        username,
+        password,
+        pool: SessionPool = None,
+        refresh_margin=None,
+        default_ttl=None,
+    ):
+        self.username = username
+        self.password = password
+        self.pool = pool or default_pool
+        self.refresh_margin = (
+            setting["token"]["refresh_margin"] if refresh_margin is None else refresh_margin
+        )
+        self.default_ttl = default_ttl or setting["token"]["default_ttl"]
+
+        self._token = None
+        self._expires_at = None
+        self._lock = threading.Lock()
+        self._flight = None
+        self._background = False
+
+        self._stats = {
+            "refreshes": 0,
+            "background_refreshes": 0,
+            "failures": 0,
+            "coalesced": 0,
+            "last_latency": 0.0,
+            "total_latency": 0.0,
+        }
+
+    def login(self):
+        record_call("login")
+        with span("aralia", "login"):
+            response = self.pool.request(
+                "POST",
+                self.login_url,
+                json={"username": self.username, "password": self.password},
+            )
+        data = response_data("POST", self.login_url, response)
+
+        if not isinstance(data, dict) or "accessToken" not in data:
+            raise AraliaAPIError(
+                "Aralia 登入回應沒有 accessToken",
+                url=self.login_url,
+                status=response.status_code,
+            )
+
+        return data["accessToken"]
+
+    def current(self):
+        """
+        Returns the token without blocking, or `None` when a blocking refresh is needed.
+        Starts a background refresh when the token is about to expire.
+        """
+
+        with self._lock:
+            token, expires_at = self._token, self._expires_at
+
+        if token is None:
+            return None
+
+        if expires_at is not None:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                return None
+            if remaining <= self.refresh_margin:
+                self._refresh_in_background()
+
+        return token
+
+    def get(self):
+        """Returns a valid token, logging in first if there is none."""
+
+        with self._lock:
+            stale = self._token
+
+        return self.current() or self.refresh(stale=stale)
+
+    def refresh(self, stale=_FORCE):
+        """
+        Logs in again and returns the new token. Callers that arrive while a
+        refresh is in flight wait for it instead of logging in themselves.
+
+        Args:
+            stale (str, optional): Token that was rejected. If another caller has
+                already replaced it, that token is returned without a login.
+        """
+
+        with self._lock:
+            if stale is not _FORCE and self._token not in (None, stale):
+                return self._token
+
+            if flight := self._flight:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                flight = self._flight = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._token
+
+        start = time.perf_counter()
+        try:
+            token = self.login()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+        else:
+            expires_at = jwt_expiry(token)
+            if expires_at is None and self.default_ttl:
+                expires_at = time.time() + self.default_ttl
+
+            latency = time.perf_counter() - start
+            with self._lock:
+                self._token, self._expires_at = token, expires_at
+                self._stats["refreshes"] += 1
+                self._stats["last_latency"] = latency
+                self._stats["total_latency"] += latency
+
+            return token
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background or self._flight is not None:
+                return
+            self._background = True
+            self._stats["background_refreshes"] += 1
+
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("背景更新 Aralia token 失敗: %r", e)
+        finally:
+            with self._lock:
+                self._background = False
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "expires_at": self._expires_at}
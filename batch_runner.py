@@ -0,0 +1,159 @@
+"""
+Runs a file of questions through AssistantGraph concurrently and writes one
+JSONL record per question: the answer, per-node latency, LLM token usage,
+the Aralia requests it made and the request's full span timeline. All questions share the pooled clients and caches.
+
+Questions are one per line (blank lines and lines starting with # are
+skipped), or JSONL with a "question" field. Credentials come from
+GOOGLE_API_KEY, ARALIA_USERNAME and ARALIA_PASSWORD, as in graph_test.py.
+
+Usage:
+    uv run batch_runner.py questions.txt [--output results.jsonl] [--concurrency 4] [--fan-out]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+from aralia.metrics import count_calls, registry, trace
+from config import setting
+from graphs import AssistantGraph
+
+
+def read_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            questions.append(json.loads(line)["question"] if line[0] == "{" else line)
+
+    return questions
+
+
+async def run_question(graph, index, question, credentials):
+    record = {"index": index, "question": question}
+
+    start = time.perf_counter()
+    # 外層先開 trace, 失敗的題目也留得住已記錄的 span
+    with count_calls() as calls, trace() as spans:
+        try:
+            result = await graph.ainvoke({"question": question, **credentials})
+            record["answer"] = result["response"]
+            record["error"] = None
+        except Exception as e:
+            record["answer"] = None
+            record["error"] = repr(e)
+
+    summary = spans.summary()
+    llm = summary.get("llm", {}).values()
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    record["nodes"] = {
+        node: {"runs": stats["count"], "seconds": stats["seconds"]}
+        for node, stats in summary.get("node", {}).items()
+    }
+    record["llm"] = {
+        "calls": sum(stats["count"] for stats in llm),
+        "input_tokens": sum(stats.get("input_tokens", 0) for stats in llm),
+        "output_tokens": sum(stats.get("output_tokens", 0) for stats in llm),
+    }
+    record["aralia"] = dict(calls)
+    record["spans"] = spans.to_dict()["spans"]
+
+    return record
+
+
+async def run(questions, output, concurrency, fan_out):
+    graph = AssistantGraph(fan_out=fan_out)
+    credentials = {
+        "llm": os.environ["GOOGLE_API_KEY"],
+        "username": os.environ["ARALIA_USERNAME"],
+        "password": os.environ["ARALIA_PASSWORD"],
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def limited(index, question):
+        async with semaphore:
+            record = await run_question(graph, index, question, credentials)
+
+        # 做完一題就寫一行, 中途停掉也保留已完成的結果
+        output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        output.flush()
+        records.append(record)
+        print(
+            f"[{len(records)}/{len(questions)}] {record['elapsed']:.1f}s "
+            f"{'ERROR ' + record['error'] if record['error'] else 'ok'}: {question}"
+        )
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(limited(i, q) for i, q in enumerate(questions)))
+    finally:
+        # 在 event loop 結束前關掉 httpx 連線
+        await graph.aclose()
+
+    return records, time.perf_counter() - start
+
+
+def summarize(records, wall):
+    elapsed = sorted(record["elapsed"] for record in records)
+    errors = sum(1 for record in records if record["error"])
+
+    print(f"\n{len(records)} questions, {errors} errors, {wall:.1f}s wall")
+    print(f"  throughput  {len(records) / wall * 60:.1f} questions/min")
+    if elapsed:
+        print(
+            f"  latency     p50 {statistics.median(elapsed):.1f}s"
+            f"  p95 {elapsed[min(len(elapsed) - 1, int(len(elapsed) * 0.95))]:.1f}s"
+            f"  max {elapsed[-1]:.1f}s"
+        )
+    print(
+        f"  llm         {sum(r['llm']['calls'] for r in records)} calls"
+        f"  {sum(r['llm']['input_tokens'] + r['llm']['output_tokens'] for r in records)} tokens"
+    )
+    print(
+        f"  aralia      {sum(r['aralia'].get('requests', 0) for r in records)} requests"
+        f"  {sum(r['aralia'].get('retries', 0) for r in records)} retries"
+    )
+    # histogram 只有 bucket 上界, p50/p95 是「不超過」的值
+    for kind in ("node", "aralia", "llm"):
+        for name, stats in registry.to_json().get(kind, {}).items():
+            print(
+                f"  {kind:<6} {name:<28} n={stats['count']:<5}"
+                f" p50<={stats['p50']:g}s p95<={stats['p95']:g}s"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("questions", help="Question file, plain text or JSONL")
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--fan-out", action="store_true", help="Plan each dataset in its own branch"
+    )
+    parser.add_argument("--debug", type=int, default=0, help="setting['debug'] level")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # 多題同時跑時 debug 輸出會交錯在一起, 預設關掉
+    setting["debug"] = args.debug
+
+    questions = read_questions(args.questions)
+    with open(args.output, "w", encoding="utf-8") as output:
+        records, wall = asyncio.run(
+            run(questions, output, args.concurrency, True if args.fan_out else None)
+        )
+
+    summarize(records, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares exploration results kept as a list of row dicts with `ColumnarRows`:
+memory held, JSON serialization time and payload size.
+
+Usage:
+    uv run benchmarks/columnar.py [--rows 100000] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aralia.columnar import ColumnarRows  # noqa: E402
+
+COUNTIES = (
+    "臺北市 新北市 桃園市 臺中市 臺南市 高雄市 基隆市 新竹市 嘉義市 新竹縣 苗栗縣 "
+    "彰化縣 南投縣 雲林縣 嘉義縣 屏東縣 宜蘭縣 花蓮縣 臺東縣 澎湖縣 金門縣 連江縣"
+).split()
+
+
+def exploration_rows(count):
+    """Rows shaped like `/api/exploration`: county x day, a count and an average."""
+
+    random.seed(0)
+    return [
+        {
+            "x": [
+                [COUNTIES[i % len(COUNTIES)]],
+                [
+                    f"2024-{i // len(COUNTIES) // 28 % 12 + 1:02d}-{i // len(COUNTIES) % 28 + 1:02d}"
+                ],
+            ],
+            "values": [random.randint(0, 5000), random.random() * 100],
+        }
+        for i in range(count)
+    ]
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, size
+
+
+def time_json(obj, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        payload = json.dumps(obj, ensure_ascii=False)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), len(payload.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    source = json.dumps(exploration_rows(args.rows))
+    rows, rows_memory = measure_memory(lambda: json.loads(source))
+    columnar, columnar_memory = measure_memory(lambda: ColumnarRows(json.loads(source)))
+    # 轉回原本格式必須完全相同
+    assert columnar.to_rows() == rows
+
+    start = time.perf_counter()
+    ColumnarRows(rows)
+    encode = time.perf_counter() - start
+
+    rows_json, rows_bytes = time_json(rows, args.runs)
+    columnar_json, columnar_bytes = time_json(columnar.to_dict(), args.runs)
+
+    print(f"{args.rows} rows")
+    print(f"  encode rows -> columnar  {encode * 1000:8.1f} ms")
+    print(f"\n{'':10} {'memory':>10} {'json.dumps':>12} {'payload':>10}")
+    print(
+        f"  {'rows':8} {rows_memory / 2**20:7.1f} MB {rows_json * 1000:9.1f} ms"
+        f" {rows_bytes / 2**20:7.1f} MB"
+    )
+    print(
+        f"  {'columnar':8} {columnar_memory / 2**20:7.1f} MB {columnar_json * 1000:9.1f} ms"
+        f" {columnar_bytes / 2**20:7.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
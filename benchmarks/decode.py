@@ -0,0 +1,127 @@
+"""
+Compares how Aralia responses travel and decode: bytes on the wire without
+compression, with gzip and with brotli, and the time to decompress and parse
+them with the stdlib `json` and with `orjson`.
+
+Recorded responses can be passed as files (the raw JSON bodies); without them
+an exploration page and a filter-options page shaped like the real ones are
+generated.
+
+Usage:
+    uv run benchmarks/decode.py [payload.json ...] [--rows 5000] [--runs 5]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aralia.codec import brotli, orjson  # noqa: E402
+
+SITES = "士林 劍潭 圓山 民權西路 雙連 中山 臺北車站 臺大醫院 中正紀念堂 古亭".split()
+
+
+def generated_payloads(rows):
+    random.seed(0)
+    exploration = {
+        "code": "OK",
+        "data": {
+            "list": [
+                {
+                    "x": [[SITES[i % len(SITES)]], [f"2024-{i % 12 + 1:02d}"]],
+                    "values": [random.randint(0, 5000), random.random() * 100],
+                }
+                for i in range(rows)
+            ],
+            "pageInfo": {"recordsFiltered": rows},
+        },
+    }
+    filter_options = {
+        "code": "OK",
+        "data": {
+            "list": [
+                {"value": f"站點{i:05d}", "count": random.randint(1, 999)}
+                for i in range(rows)
+            ],
+            "pageInfo": {"recordsFiltered": rows},
+        },
+    }
+
+    return {
+        f"exploration ({rows} rows)": json.dumps(exploration, ensure_ascii=False),
+        f"filter-options ({rows} values)": json.dumps(
+            filter_options, ensure_ascii=False
+        ),
+    }
+
+
+def median_time(call, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("payloads", nargs="*", help="Recorded response bodies")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payloads:
+        payloads = {}
+        for path in args.payloads:
+            with open(path, encoding="utf-8") as f:
+                payloads[os.path.basename(path)] = f.read()
+    else:
+        payloads = generated_payloads(args.rows)
+
+    for name, text in payloads.items():
+        raw = text.encode()
+        encodings = {"identity": (raw, lambda: raw), "gzip": None, "br": None}
+        compressed = gzip.compress(raw, compresslevel=6)
+        encodings["gzip"] = (compressed, lambda c=compressed: gzip.decompress(c))
+        if brotli is not None:
+            compressed = brotli.compress(raw, quality=5)
+            encodings["br"] = (compressed, lambda c=compressed: brotli.decompress(c))
+        else:
+            del encodings["br"]
+
+        decoders = {"json": json.loads}
+        if orjson is not None:
+            decoders["orjson"] = orjson.loads
+        # 解出來必須完全相同
+        assert all(decode(raw) == json.loads(raw) for decode in decoders.values())
+
+        print(f"{name}")
+        print(f"  {'':10} {'wire':>9} {'inflate':>10}", end="")
+        for decoder in decoders:
+            print(f" {decoder + ' total':>14}", end="")
+        print()
+
+        for encoding, (body, inflate) in encodings.items():
+            inflate_time = median_time(inflate, args.runs)
+            print(
+                f"  {encoding:10} {len(body) / 1024:6.0f} KB {inflate_time * 1000:7.1f} ms",
+                end="",
+            )
+            for decode in decoders.values():
+                total = median_time(lambda: decode(inflate()), args.runs)
+                print(f" {total * 1000:11.1f} ms", end="")
+            print()
+
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Compares the filter-decision prompt with every candidate value against the one
+built from the top-k candidates of `CandidateIndex`.
+
+The prompt size is measured offline. With `--llm GOOGLE_API_KEY` the same
+structured-output call as `filter_decision_agent` is also timed for both prompts.
+
+Usage:
+    uv run benchmarks/filter_candidates.py [--values 1000] [--top-k 50] [--llm API_KEY]
+"""
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aralia.compact import estimate_tokens  # noqa: E402
+from aralia.fuzzy import CandidateIndex, preselect_candidates  # noqa: E402
+from graphs import prompts, schema  # noqa: E402
+
+QUESTION = "請列出 2024年3月 士林站與劍潭站平日上午的出站人數"
+
+STATIONS = (
+    "淡水 紅樹林 竹圍 關渡 忠義 復興崗 北投 奇岩 唭哩岸 石牌 明德 芝山 士林 劍潭 圓山 "
+    "民權西路 雙連 中山 台北車站 台大醫院 中正紀念堂 東門 大安森林公園 大安 信義安和 "
+    "台北101/世貿 象山 古亭 頂溪 永安市場 景安 南勢角 西門 龍山寺 江子翠 新埔 板橋 府中 "
+    "亞東醫院 海山 土城 永寧 頂埔 忠孝新生 忠孝復興 忠孝敦化 國父紀念館 市政府 永春 後山埤 "
+    "昆陽 南港 南港展覽館 松山 南京三民 台北小巨蛋 南京復興 松江南京 北門 小南門 公館 萬隆 "
+    "景美 大坪林 七張 新店區公所 新店 動物園 木柵 萬芳社區 辛亥 麟光 六張犁 科技大樓 大直 "
+    "劍南路 西湖 港墘 文德 內湖 大湖公園 葫洲 東湖 南港軟體園區"
+).split()
+
+
+def candidate_values(count):
+    """Station names padded with 站出口 variants up to `count` distinct values."""
+
+    values = list(STATIONS)
+    i = 0
+    while len(values) < count:
+        values.append(f"{STATIONS[i % len(STATIONS)]}站{i // len(STATIONS) + 1}號出口")
+        i += 1
+
+    return values[:count]
+
+
+def charts(values):
+    return [
+        {
+            "id": "benchmark",
+            "name": "臺北捷運各站進出站人次",
+            "description": "臺北捷運各站每日各時段進出站人次",
+            "siteName": "交通運輸星球",
+            "sourceURL": "https://example.araliadata.io",
+            "x": [{"columnID": "c-date", "type": "date", "format": "month"}],
+            "y": [{"columnID": "c-exits", "type": "integer", "calculation": "sum"}],
+            "filter": [
+                {
+                    "columnID": "c-station",
+                    "type": "nominal",
+                    "displayName": "車站",
+                    "format": "",
+                    "values": values,
+                }
+            ],
+        }
+    ]
+
+
+def build_prompt(response):
+    return prompts.query_generate_template.invoke(
+        {"question": QUESTION, "response": response}
+    ).to_string()
+
+
+def time_llm(api_key, prompt, runs):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        api_key=api_key, model="gemini-2.0-flash", temperature=0
+    )
+    structured_llm = llm.with_structured_output(schema.query_list)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        structured_llm.invoke(prompt)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--values", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--llm", metavar="API_KEY", help="另外量測 Gemini 的回應時間")
+    args = parser.parse_args()
+
+    values = candidate_values(args.values)
+    full = charts(values)
+
+    build = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        CandidateIndex(values)
+        build.append(time.perf_counter() - start)
+
+    index = CandidateIndex(values)
+    search = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        index.preselect(QUESTION, args.top_k)
+        search.append(time.perf_counter() - start)
+
+    records = [{"values": values}]
+    preselect_candidates(records, QUESTION, args.top_k)
+    trimmed = copy.deepcopy(full)
+    trimmed[0]["filter"][0]["values"] = records[0]["values"]
+
+    print(f"{args.values} candidate values, top {args.top_k}")
+    print(f"  index build  {statistics.median(build) * 1000:8.2f} ms")
+    print(f"  preselect    {statistics.median(search) * 1000:8.2f} ms")
+    print(f"  top values   {json.dumps(records[0]['values'][:5], ensure_ascii=False)}")
+
+    prompts_by_name = {"full": build_prompt(full), "top-k": build_prompt(trimmed)}
+    print("\nfilter_decision prompt")
+    for name, prompt in prompts_by_name.items():
+        print(f"  {name:6} {len(prompt):8} chars  ~{estimate_tokens(prompt):7} tokens")
+
+    if args.llm:
+        print("\nstructured LLM call (median)")
+        for name, prompt in prompts_by_name.items():
+            runs = max(1, min(args.runs, 3))
+            print(f"  {name:6} {time_llm(args.llm, prompt, runs):8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures how long a freshly spawned stdio MCP server takes to answer `initialize`.
+
+Usage:
+    uv run benchmarks/startup.py [--runs 10] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {},
+        "clientInfo": {"name": "startup-benchmark", "version": "0.1.0"},
+    },
+}
+
+
+def server_env():
+    # server 在第一次呼叫 tool 前不會登入, 沒有帳密也能量測
+    env = dict(os.environ)
+    env.setdefault("ARALIA_USERNAME", "benchmark")
+    env.setdefault("ARALIA_PASSWORD", "benchmark")
+    return env
+
+
+def time_initialize():
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "server.py"],
+        cwd=ROOT,
+        env=server_env(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        encoding="utf-8",
+    )
+
+    try:
+        process.stdin.write(json.dumps(INITIALIZE) + "\n")
+        process.stdin.flush()
+
+        for line in process.stdout:
+            if json.loads(line).get("id") == 1:
+                return time.perf_counter() - start
+
+        raise RuntimeError("server 結束前沒有回應 initialize")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_time(top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=ROOT,
+        env=server_env(),
+        capture_output=True,
+        text=True,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+
+    for cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true", help="列出 import server 最慢的模組")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    time_initialize()  # 第一次會編譯 .pyc, 不列入計算
+    timings = [time_initialize() for _ in range(args.runs)]
+
+    print(f"initialize over stdio ({args.runs} runs)")
+    print(f"  min    {min(timings) * 1000:8.1f} ms")
+    print(f"  median {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"  max    {max(timings) * 1000:8.1f} ms")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative)")
+        import_time(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,91 @@
 setting = {
-    "debug": 3  # 2:輕度debug, 3:深度debug
+    "debug": 3,  # 2:輕度debug, 3:深度debug
+    # 每個 Aralia 星球(host)各自一個 keep-alive session
+    "http": {
+        "pool_connections": 10,  # 每個 host 保留的 connection pool 數量
+        "pool_maxsize": 10,  # 每個 pool 最多保留的 keep-alive 連線數
+        "per_host_limit": 10,  # 同一個 host 同時進行中的 request 上限
+        "keep_alive": True,
+        "connect_timeout": 5,  # 秒
+        "read_timeout": 60,  # 秒, 大型查詢回應較慢
+        "compress": True,  # 要求 gzip/brotli 壓縮回應
+    },
+    # 429/5xx 與連線錯誤的重送, 等待時間為指數 backoff 加上 jitter
+    "retry": {"retries": 3, "backoff": 0.5, "backoff_max": 8},
+    # 同一個 host 連續失敗 failures 次後, reset 秒內直接失敗不再送出
+    "breaker": {"failures": 5, "reset": 30},
+    "token": {
+        "refresh_margin": 300,  # token 到期前幾秒在背景先換新
+        "default_ttl": None,  # JWT 沒有 exp 時假設的有效秒數, None 表示只在 401 時換新
+    },
+    # galaxy dataset 搜尋, 同時查詢所有星系後合併並依 dataset id 去除重複
+    "search": {
+        "galaxies": [
+            "https://k-star.araliadata.io/api",
+            "https://tw-air.araliadata.io/api",
+            "https://global-sdgs.araliadata.io/api",
+        ],
+        "timeout": 10,  # 每個星系的等待秒數, 逾時的星系直接略過
+        "page_size": 50,  # 每個星系取回的筆數
+        "max_results": 50,  # 合併後最多保留的筆數
+    },
+    "cache": {
+        # galaxy dataset 搜尋結果, key 為正規化後的問題
+        "search": {"maxsize": 256, "ttl": 600},
+        # 資料集欄位 metadata, 以 sourceURL + dataset id 存在 SQLite, 過期後用 ETag 重新驗證
+        "metadata": {"path": "~/.cache/aralia-mcp/metadata.sqlite3", "ttl": 86400},
+        # filter-options 候選值, key 為 (sourceURL, dataset id, columnID, format)
+        "filter_options": {
+            "maxsize": 200000,  # 所有快取的候選值總數上限
+            "ttl": 3600,
+            "warm_up": False,  # 取得欄位 metadata 後在背景預先載入候選值
+            "warm_space_formats": ["admin_level_4"],  # 預先載入的 space 欄位層級
+        },
+    },
+    # 圖表查詢分頁, 關閉時維持舊行為只取第一頁 50 筆;
+    # MCP 的 search_aralia_data_final_step 另外以 max_rows 參數控制, 預設 50 筆
+    "exploration": {
+        "paginate": True,
+        "page_size": 500,
+        "max_rows": 5000,  # 每張圖表最多保留的資料筆數, 超過會標記 truncated
+        "columnar": False,  # chart["data"] 改存成 ColumnarRows, 大量資料較省記憶體
+    },
+    # filter-options 候選值分頁列舉
+    "filter_options": {
+        "page_size": 1000,
+        "max_values": 20000,  # 每個欄位最多列舉的候選值數量
+        "narrow": True,  # 超過一頁的欄位改用問題關鍵字請 server 縮小範圍
+        "max_keywords": 8,
+        "top_k": 50,  # 每個欄位交給 LLM 的候選值上限, 依問題的 n-gram 相似度挑選
+    },
+    # 交給 LLM 挑選資料集前, 先用 BM25 排序搜尋結果只留前 top_k 個
+    "ranking": {
+        "top_k": 10,
+        "fields": {"name": 2, "description": 1, "siteName": 1},  # 欄位權重
+    },
+    # graph 放進 prompt 的資料集/欄位清單 (估計 tokens)
+    "prompt": {
+        "datasets_budget": 3000,
+        "columns_budget": 6000,
+        "description_chars": 120,  # 說明文字截斷長度, 超過預算時再逐步減半
+    },
+    "concurrency": {
+        "max_workers": 16,  # 同步版 AraliaTools 平行發送 request 的 thread 上限
+        "filter_options": 8,  # 同時進行的 filter-options request 上限
+    },
+    "graph": {
+        # 每個資料集各自一條平行的規劃/filter/取資料流程; 預設關閉,
+        # 因為每個資料集各自呼叫 LLM, 規劃時也無法互相比較資料集
+        "fan_out": False,
+    },
+    # AssistantGraph 依帳號/API key 保留的 LLM 與 AraliaTools
+    "client_pool": {
+        "idle": 1800,  # 秒, 沒被用到的 client 清掉
+        "maxsize": 64,
+    },
+    "metrics": {
+        # 延遲 histogram 的 bucket 上界 (秒)
+        "buckets": [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+        "max_spans": 2000,  # 每個 request 最多保留的 span 數
+    },
 }
-
-
-exec_time = []
@@ -1,7 +1,6 @@
 from graphs import AssistantGraph
 import os
 from dotenv import load_dotenv
-from graphs.node import print_exec_time
 
 load_dotenv()
 
@@ -22,14 +21,15 @@ question = [
 ]
 
 for item in question:
-    response = assistant_graph(
+    result = assistant_graph(
         {
             "question": item,
             "llm": os.environ["GOOGLE_API_KEY"],
             "username": os.environ["ARALIA_USERNAME"],
             "password": os.environ["ARALIA_PASSWORD"],
         }
-    )["response"]
-    # print(response)
+    )
+    # print(result["response"])
+    print(result["trace"].report())
 
-print_exec_time()
+print(assistant_graph.export_metrics("prometheus"))
@@ -1,3 +1,11 @@
-from .graph import AssistantGraph
-
 __all__ = ["AssistantGraph"]
+
+
+def __getattr__(name):
+    # langgraph / langchain 載入很慢, 真的用到 AssistantGraph 才 import
+    if name == "AssistantGraph":
+        from .graph import AssistantGraph
+
+        return AssistantGraph
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,88 +1,43 @@
-import requests
 from typing import List
 
+from aralia import AraliaClient, AsyncAraliaClient
 
-class AraliaTools:
-    # https://k-star.araliadata.io/api, https://tw-air.araliadata.io/api
-    official_url = "https://tw-air.araliadata.io/api"
 
-    def __init__(self, username, password):
-        self.username = username
-        self.password = password
-        self.token = self.login()
-
-    def login(self):
-        return (
-            requests.post(
-                "https://xwckbycddv4zlzeslemvhoh6sa0xoxcc.lambda-url.ap-southeast-1.on.aws/",
-                json={"username": self.username, "password": self.password},
-            )
-            .json()
-            .get("data")["accessToken"]
-        )
-
-    def get(self, url, query={}):
-        """
-        Sends a GET request with an Authorization Bearer token and retrieves the response.
-
-        Args:
-            token (str):
-            url (str): Endpoint to send the GET request to, appended to the base URL.
-            query (dict, optional): Query parameters to include in the GET request. Defaults to an empty dictionary.
-
-        Returns:
-            dict or list: Parsed response based on `allData` and response structure.
-        """
-
-        for attempt in range(2):
-            # Define the Authorization header
-            headers = {"Authorization": f"Bearer {self.token}"}
-
-            # Send the GET request
-            response = requests.get(url, headers=headers, params=query)
-
-            if response.status_code == 200:
-                break
-            else:
-                self.login()
+class AraliaTools(AraliaClient):
+    def search_tool(self, question: str):
+        response = self.search_datasets(question)
 
-        data = response.json().get("data")
+        for item in response:
+            item.pop("sourceType")
+            item["sourceURL"], _, _ = item["sourceURL"].partition("/admin")
 
-        return data.get("list", data)
+        return {item["id"]: item for item in response}
 
-    def post(self, url, query={}):
-        """
-        Sends a POST request with an Authorization Bearer token and retrieves the response.
+    def column_metadata_tool(self, datasets: List[any]):
+        for dataset, columns in zip(datasets, self.fetch_columns(datasets)):
+            if columns is not None:
+                dataset["columns"] = {column["columnID"]: column for column in columns}
 
-        Args:
-            token (str):
-            url (str): Endpoint to send the GET request to, appended to the base URL.
-            query (dict, optional): Query parameters to include in the GET request. Defaults to an empty dictionary.
+        return {dataset["id"]: dataset for dataset in datasets if "columns" in dataset}
 
-        Returns:
-            dict or list: Parsed response based on `allData` and response structure.
-        """
+    def filter_option_tool(self, datasets: List, question: str = None):
+        timings = self.fetch_filter_options(datasets, question)
 
-        for attempt in range(2):
-            # Define the Authorization header
-            headers = {"Authorization": f"Bearer {self.token}"}
+        filter_columns = [column for dataset in datasets for column in dataset["filter"]]
+        for filter_column, timing in zip(filter_columns, timings):
+            filter_column["values"] = timing.pop("values")
 
-            # Send the POST request
-            response = requests.post(url, headers=headers, json=query)
+        return timings
 
-            if response.status_code == 200:
-                break
-            else:
-                self.login()
+    def explore_tool(self, charts: List):
+        self.explore(charts)
 
-        data = response.json().get("data")
 
-        return data.get("list", data)
+class AsyncAraliaTools(AsyncAraliaClient):
+    """Awaitable counterpart of `AraliaTools` for the async graph nodes."""
 
-    def search_tool(self, question: str):
-        response = self.get(
-            self.official_url + "/galaxy/dataset", {"keyword": question, "pageSize": 50}
-        )
+    async def search_tool(self, question: str):
+        response = await self.search_datasets(question)
 
         for item in response:
             item.pop("sourceType")
@@ -90,77 +45,21 @@ class AraliaTools:
 
         return {item["id"]: item for item in response}
 
-    def column_metadata_tool(self, datasets: List[any]):
-        for dataset in datasets:
-            if column_metadata := self.get(
-                f"{dataset['sourceURL']}/api/dataset/{dataset['id']}"
-            ):
-                cols_exclude = [
-                    "id",
-                    "name",
-                    "datasetID",
-                    "visible",
-                    "ordinalPosition",
-                    "sortingSettingID",
-                ]
-                virtual_exclude = [
-                    "id",
-                    "name",
-                    "datasetID",
-                    "visible",
-                    "setting",
-                    "sourceType",
-                    "language",
-                    "country",
-                ]
-
-                dataset["columns"] = {
-                    column["id"]: {
-                        **{"columnID": column["id"]},
-                        **{k: v for k, v in column.items() if k not in cols_exclude},
-                    }
-                    for column in column_metadata["columns"]
-                    if column["type"] != "undefined" and column["visible"]
-                }
-
-                if virtual_vars := self.get(
-                    f"{dataset['sourceURL']}/api/dataset/{dataset['id']}/virtual-variables"
-                ):
-                    dataset["columns"].update(
-                        {
-                            var["id"]: {
-                                "columnID": var["id"],
-                                **{
-                                    k: v
-                                    for k, v in var.items()
-                                    if k not in virtual_exclude
-                                },
-                            }
-                            for var in virtual_vars
-                        }
-                    )
+    async def column_metadata_tool(self, datasets: List[any]):
+        for dataset, columns in zip(datasets, await self.fetch_columns(datasets)):
+            if columns is not None:
+                dataset["columns"] = {column["columnID"]: column for column in columns}
 
         return {dataset["id"]: dataset for dataset in datasets if "columns" in dataset}
 
-    def filter_option_tool(self, datasets: List):
-        for dataset in datasets:
-            for filter_column in dataset["filter"]:
-                response = self.post(
-                    dataset["sourceURL"]
-                    + "/api/exploration/"
-                    + dataset["id"]
-                    + "/filter-options?start=0&pageSize=1000",
-                    {"x": [filter_column]},
-                )
-                filter_column["values"] = [item["x"][0][0] for item in response]
+    async def filter_option_tool(self, datasets: List, question: str = None):
+        timings = await self.fetch_filter_options(datasets, question)
 
-    def explore_tool(self, charts: List):
-        for chart in charts:
-            response = self.post(
-                chart["sourceURL"]
-                + "/api/exploration/"
-                + chart["id"]
-                + "?start=0&pageSize=50",
-                chart,
-            )
-            chart["data"] = response
+        filter_columns = [column for dataset in datasets for column in dataset["filter"]]
+        for filter_column, timing in zip(filter_columns, timings):
+            filter_column["values"] = timing.pop("values")
+
+        return timings
+
+    async def explore_tool(self, charts: List):
+        await self.explore(charts)
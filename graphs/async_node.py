@@ -0,0 +1,148 @@
+# node.py 的 async 版本, 給 AssistantGraph.ainvoke 使用: prompt 與回應解析共用,
+# 只差在 await llm.ainvoke 與 AsyncAraliaTools, 一個 event loop 可同時處理多個問題
+
+import asyncio
+import json
+
+from aralia.metrics import timed
+from config import setting
+from . import schema
+from .node import (
+    _chosen_filters,
+    _filter_prompt,
+    _planned_charts,
+    _planning_prompt,
+    _search_prompt,
+    _search_result,
+    fan_out_datasets,
+    merge_charts,
+)
+from .state import BasicState
+
+# 背景預載的 task, 留著 reference 避免還沒跑完就被回收
+_background = set()
+
+
+@timed("node")
+async def aralia_search_agent(state: BasicState):
+    datasets = await state["at"].search_tool(state["question"])
+
+    datasets, search_scores, extract_prompt = _search_prompt(state, datasets)
+
+    structured_llm = state["llm"].with_structured_output(schema.datasets_extract_output)
+
+    for _ in range(5):
+        try:
+            # extract datasets
+            response = (await structured_llm.ainvoke(extract_prompt)).dict()
+
+            filtered_datasets = [datasets[item] for item in response["dataset_key"]]
+            break
+        except Exception as e:
+            if setting["debug"]:
+                print(f"發生錯誤: {e}")
+            continue
+    else:
+        raise RuntimeError("無法找到可能回答問題的資料集，程式終止")
+
+    return _search_result(datasets, search_scores, filtered_datasets)
+
+
+@timed("node")
+async def analytics_planning_agent(state: BasicState):
+    datasets = await state["at"].column_metadata_tool(state["response"])
+
+    if not datasets:
+        raise RuntimeError("無法跟搜尋到的星球要資料，程式終止")
+
+    if setting["cache"]["filter_options"]["warm_up"]:
+        # LLM 規劃圖表的同時預先載入 filter_decision_agent 需要的候選值
+        task = asyncio.create_task(
+            state["at"].warm_filter_options(list(datasets.values()))
+        )
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    plot_chart_prompt = _planning_prompt(state, datasets)
+
+    for _ in range(5):
+        try:
+            response = await state["llm"].ainvoke(plot_chart_prompt)
+
+            if setting["debug"]:
+                print(response.content, end="\n\n")
+
+            filtered_datasets = _planned_charts(datasets, response.content)
+            break
+        except Exception as e:
+            if setting["debug"]:
+                print(f"發生錯誤: {e}")
+            continue
+    else:
+        raise RuntimeError("AI模型無法產出準確的api調用")
+
+    if setting["debug"]:
+        print("# analytics_planning_agent:\n")
+        print(json.dumps(filtered_datasets, ensure_ascii=False, indent=2), end="\n\n")
+
+    return {"response": filtered_datasets}
+
+
+@timed("node")
+async def filter_decision_agent(state: BasicState):
+    timings = await state["at"].filter_option_tool(state["response"], state["question"])
+
+    prompt = _filter_prompt(state, timings)
+
+    structured_llm = state["llm"].with_structured_output(schema.query_list)
+
+    for _ in range(5):
+        try:
+            response = _chosen_filters(
+                (await structured_llm.ainvoke(prompt)).dict()["querys"]
+            )
+            break
+        except Exception as e:
+            if setting["debug"]:
+                print(f"發生錯誤: {e}")
+            continue
+    else:
+        raise RuntimeError("AI模型無法選擇準確的filter value")
+
+    if setting["debug"]:
+        print("# filter_decision_agent\n")
+        print(json.dumps(response, ensure_ascii=False, indent=2), end="\n\n")
+
+    return {"response": response}
+
+
+@timed("node")
+async def analytics_execution_agent(state: BasicState):
+    if setting["debug"]:
+        print("# analytics_execution_agent:\n")
+
+    await state["at"].explore_tool(state["response"])
+
+    return {
+        "response": [state["response"]],
+    }
+
+
+@timed("node")
+async def dataset_branch(state: BasicState):
+    """Async `node.dataset_branch`."""
+
+    try:
+        state = {**state, **await analytics_planning_agent(state)}
+        if not state["response"]:
+            return {"charts": []}
+
+        for agent in (filter_decision_agent, analytics_execution_agent):
+            state = {**state, **await agent(state)}
+    except RuntimeError as e:
+        if setting["debug"]:
+            print(f"資料集 {state['response'][0].get('id')} 略過: {e}")
+        return {"charts": []}
+
+    # analytics_execution_agent 回傳 [charts]
+    return {"charts": state["response"][0]}
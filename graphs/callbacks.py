@@ -0,0 +1,48 @@
+from langchain_core.callbacks import BaseCallbackHandler
+
+from aralia.metrics import Span
+
+
+class SpanCallback(BaseCallbackHandler):
+    """
+    Records every LLM call of a graph run as an `llm` span named after the
+    model, with its token usage in the span's counts.
+    """
+
+    # 在呼叫 LLM 的 context 裡執行, span 才會記到同一個 request 的 trace
+    run_inline = True
+
+    def __init__(self):
+        self._spans = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def _start(self, serialized, run_id, kwargs):
+        metadata = kwargs.get("metadata") or {}
+        name = (
+            metadata.get("ls_model_name")
+            or kwargs.get("name")
+            or (serialized or {}).get("name", "llm")
+        )
+        self._spans[run_id] = Span("llm", name)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if (span := self._spans.pop(run_id, None)) is None:
+            return
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                for key in ("input_tokens", "output_tokens"):
+                    if key in usage:
+                        span.counts[key] = span.counts.get(key, 0) + usage[key]
+        span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        if (span := self._spans.pop(run_id, None)) is not None:
+            span.end(error)
@@ -1,6 +1,3 @@
-# 標準庫導入
-import time
-
 # 第三方庫導入
 from langgraph.graph import StateGraph, END
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -8,42 +5,181 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 # 本地模組導入
 from . import aralia_tools
+from . import async_node
 from . import node
+from .callbacks import SpanCallback
+from .pool import ClientPool, credential_key
 from .state import BasicState
-from config import exec_time
+from aralia import metrics
+from config import setting
 
 
 class AssistantGraph:
-    def __init__(self):
+    # 所有 AssistantGraph 共用, 同一組 API key / 帳號的 request 直接沿用已建立的 client
+    clients = ClientPool()
+
+    def __init__(self, fan_out=None):
+        """
+        Args:
+            fan_out (bool, optional): Plan, filter and explore each dataset as
+                its own concurrent branch instead of all datasets in one chain,
+                defaults to `setting["graph"]["fan_out"]`.
+        """
+
+        if fan_out is None:
+            fan_out = setting["graph"]["fan_out"]
+
+        self.graph = self._build(node, fan_out)
+        # 同樣的流程, 節點換成 async 版本, 給 ainvoke / astream 使用
+        self.agraph = self._build(async_node, fan_out)
+
+        # print(graph.get_graph().draw_mermaid()) # draw graph for debug
+
+    @staticmethod
+    def _build(nodes, fan_out):
         builder = StateGraph(BasicState)
 
         # add node
-        builder.add_node("aralia_search_agent", node.aralia_search_agent)
-        builder.add_node("analytics_planning_agent", node.analytics_planning_agent)
-        builder.add_node("filter_decision_agent", node.filter_decision_agent)
-        builder.add_node("analytics_execution_agent", node.analytics_execution_agent)
-
+        builder.add_node("aralia_search_agent", nodes.aralia_search_agent)
         builder.set_entry_point("aralia_search_agent")
 
-        # add edge
-        builder.add_edge("aralia_search_agent", "analytics_planning_agent")
-        builder.add_edge("analytics_planning_agent", "filter_decision_agent")
-        builder.add_edge("filter_decision_agent", "analytics_execution_agent")
-        builder.add_edge("analytics_execution_agent", END)
+        if fan_out:
+            # 每個資料集各自規劃、選 filter、取資料, 最慢的資料集決定總時間
+            builder.add_node("dataset_branch", nodes.dataset_branch)
+            builder.add_node("merge_charts", nodes.merge_charts)
 
-        self.graph = builder.compile()
+            builder.add_conditional_edges(
+                "aralia_search_agent", nodes.fan_out_datasets, ["dataset_branch"]
+            )
+            builder.add_edge("dataset_branch", "merge_charts")
+            builder.add_edge("merge_charts", END)
+        else:
+            builder.add_node("analytics_planning_agent", nodes.analytics_planning_agent)
+            builder.add_node("filter_decision_agent", nodes.filter_decision_agent)
+            builder.add_node(
+                "analytics_execution_agent", nodes.analytics_execution_agent
+            )
 
-        # print(graph.get_graph().draw_mermaid()) # draw graph for debug
+            # add edge
+            builder.add_edge("aralia_search_agent", "analytics_planning_agent")
+            builder.add_edge("analytics_planning_agent", "filter_decision_agent")
+            builder.add_edge("filter_decision_agent", "analytics_execution_agent")
+            builder.add_edge("analytics_execution_agent", END)
 
-    def __call__(self, request):
-        exec_time.append(time.perf_counter())
-        request["llm"] = ChatGoogleGenerativeAI(
-            api_key=request["llm"], model="gemini-2.0-flash", temperature=0
+        return builder.compile()
+
+    def _llm(self, api_key):
+        return self.clients.get(
+            credential_key("llm", api_key),
+            lambda: ChatGoogleGenerativeAI(
+                api_key=api_key, model="gemini-2.0-flash", temperature=0
+            ),
         )
+
+    def __call__(self, request):
+        """
+        Answers one question. The returned state also holds a `trace` with
+        the spans (nodes, Aralia requests, LLM calls, retries) of this request.
+        """
+
+        request["llm"] = self._llm(request["llm"])
         # request['llm'] = ChatOpenAI(
         #     api_key=request['llm'], model="gpt-4o", temperature=0)
-        request["at"] = aralia_tools.AraliaTools(
-            request["username"], request["password"]
+        request["at"] = self.clients.get(
+            credential_key("aralia", request["username"], request["password"]),
+            lambda: aralia_tools.AraliaTools(request["username"], request["password"]),
         )
 
-        return self.graph.invoke(request)
+        with metrics.trace() as trace:
+            result = self.graph.invoke(request, self._config())
+
+        return {**result, "trace": trace}
+
+    @staticmethod
+    def _config(config=None):
+        """Adds the LLM span callback to a LangGraph run config."""
+
+        config = dict(config or {})
+        callbacks = config.get("callbacks")
+        if callbacks is None or isinstance(callbacks, list):
+            config["callbacks"] = [*(callbacks or []), SpanCallback()]
+
+        return config
+
+    def _async_request(self, request):
+        # AsyncAraliaTools 在第一個 request 才登入, 建立本身不會卡住 event loop
+        return {
+            **request,
+            "llm": self._llm(request["llm"]),
+            "at": self.clients.get(
+                credential_key(
+                    "aralia-async", request["username"], request["password"]
+                ),
+                lambda: aralia_tools.AsyncAraliaTools(
+                    request["username"], request["password"]
+                ),
+            ),
+        }
+
+    async def ainvoke(self, request, config=None):
+        """
+        Async `__call__`: the nodes await the LLM and Aralia instead of
+        blocking, so many questions can run concurrently on one event loop.
+
+        Args:
+            request (dict): Same as `__call__`.
+            config (dict, optional): LangGraph run config, e.g. `{"callbacks": [...]}`.
+
+        Returns:
+            dict: Final state plus the request's `trace`, see `__call__`.
+        """
+
+        with metrics.trace() as trace:
+            result = await self.agraph.ainvoke(
+                self._async_request(request), self._config(config)
+            )
+
+        return {**result, "trace": trace}
+
+    async def astream(self, request, stream_mode="updates", config=None):
+        """
+        Yields the graph's progress while it runs, by default the update of
+        each node as soon as it finishes.
+
+        Args:
+            request (dict): Same as `__call__`.
+            stream_mode (str, optional): LangGraph stream mode, e.g. `"updates"` or `"values"`.
+            config (dict, optional): LangGraph run config.
+        """
+
+        async for chunk in self.agraph.astream(
+            self._async_request(request), self._config(config), stream_mode=stream_mode
+        ):
+            yield chunk
+
+    async def aclose(self):
+        """
+        Closes the pooled clients and their connections, e.g. before the event
+        loop running `ainvoke` shuts down. Later calls build new clients.
+        """
+
+        await self.clients.aclose()
+
+    def client_stats(self):
+        """Pool `hits`, `misses`, `evictions` and current `size`."""
+
+        return self.clients.stats()
+
+    @staticmethod
+    def export_metrics(format="json"):
+        """
+        Latency histograms of every span recorded in this process.
+
+        Args:
+            format (str, optional): `"json"` for a dict, `"prometheus"` for the text exposition format.
+        """
+
+        if format == "prometheus":
+            return metrics.registry.to_prometheus()
+
+        return metrics.registry.to_json()
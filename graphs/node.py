@@ -1,20 +1,23 @@
 import json
-import time
-from config import setting, exec_time
+import threading
+from config import setting
+from aralia.compact import compact_columns, compact_datasets, estimate_tokens
+from aralia.metrics import timed
+from aralia.ranking import rank_datasets
 from . import prompts
 from .state import BasicState
 from . import schema
 import re
 
+from langgraph.types import Send
 
+
+@timed("node")
 def aralia_search_agent(state: BasicState):
     # search multi dataset
-    exec_time.append(time.perf_counter())
     datasets = state["at"].search_tool(state["question"])
-    exec_time.append(time.perf_counter())
-    extract_prompt = prompts.simple_datasets_extract_template.invoke(
-        {"question": state["question"], "datasets": datasets}
-    )
+
+    datasets, search_scores, extract_prompt = _search_prompt(state, datasets)
 
     structured_llm = state["llm"].with_structured_output(schema.datasets_extract_output)
 
@@ -32,29 +35,67 @@ def aralia_search_agent(state: BasicState):
     else:
         raise RuntimeError("無法找到可能回答問題的資料集，程式終止")
 
+    return _search_result(datasets, search_scores, filtered_datasets)
+
+
+def _search_prompt(state: BasicState, datasets):
+    """
+    Ranks the search results and builds the dataset extraction prompt.
+
+    Returns:
+        tuple: `(datasets, search_scores, extract_prompt)`, `datasets` keeps only the top_k.
+    """
+
+    # 先在本地排序, 只把最相關的 top_k 個資料集交給 LLM
+    ranked = rank_datasets(
+        state["question"],
+        datasets.values(),
+        setting["ranking"]["top_k"],
+        setting["ranking"]["fields"],
+    )
+    search_scores = {dataset["id"]: score for dataset, score in ranked}
+    datasets = {dataset["id"]: dataset for dataset, _ in ranked}
+
+    datasets_table, _ = compact_datasets(datasets.values())
+    extract_prompt = prompts.simple_datasets_extract_template.invoke(
+        {"question": state["question"], "datasets": datasets_table}
+    )
+
+    if setting["debug"]:
+        tokens = estimate_tokens(extract_prompt.to_string())
+        print(f"# aralia_search_agent prompt: ~{tokens} tokens\n")
+
+    return datasets, search_scores, extract_prompt
+
+
+def _search_result(datasets, search_scores, filtered_datasets):
     if setting["debug"]:
         print("# aralia_search_agent:\n")
-        print([item["name"] for item in datasets.values()], end="\n\n")
+        print(
+            [(item["name"], round(search_scores[item["id"]], 2)) for item in datasets.values()],
+            end="\n\n",
+        )
         print([item["name"] for item in filtered_datasets], end="\n\n")
 
-    return {"response": filtered_datasets}
+    return {"response": filtered_datasets, "search_scores": search_scores}
 
 
+@timed("node")
 def analytics_planning_agent(state: BasicState):
-    exec_time.append(time.perf_counter())
     datasets = state["at"].column_metadata_tool(state["response"])
-    exec_time.append(time.perf_counter())
 
     if not datasets:
         raise RuntimeError("無法跟搜尋到的星球要資料，程式終止")
 
-    plot_chart_prompt = prompts.chart_ploting_template.invoke(  # extract column
-        {
-            "question": state["question"],
-            "datasets": datasets,
-            "admin_level": prompts.admin_level,
-        }
-    )
+    if setting["cache"]["filter_options"]["warm_up"]:
+        # LLM 規劃圖表的同時預先載入 filter_decision_agent 需要的候選值
+        threading.Thread(
+            target=state["at"].warm_filter_options,
+            args=(list(datasets.values()),),
+            daemon=True,
+        ).start()
+
+    plot_chart_prompt = _planning_prompt(state, datasets)
 
     for _ in range(5):
         try:
@@ -63,84 +104,7 @@ def analytics_planning_agent(state: BasicState):
             if setting["debug"]:
                 print(response.content, end="\n\n")
 
-            response_json = json.loads(
-                list(re.finditer(r"```json(.*?)```", response.content, re.DOTALL))[
-                    -1
-                ].group(1)
-            )
-
-            filtered_datasets = [
-                {
-                    **{
-                        k: v for k, v in datasets[chart["id"]].items() if k != "columns"
-                    },
-                    "x": [
-                        {
-                            **datasets[chart["id"]]["columns"][x["columnID"]],
-                            "format": x["format"]
-                            if x["type"] not in ["date", "datetime", "space"]
-                            else x["format"]
-                            if (
-                                (
-                                    x["type"] in ["date", "datetime"]
-                                    and (
-                                        x["format"] in prompts.format["date"]
-                                        or (_ := None)
-                                    )
-                                )
-                                or (
-                                    x["type"] == "space"
-                                    and (
-                                        x["format"] in prompts.format["space"]
-                                        or (_ := None)
-                                    )
-                                )
-                            )
-                            else x["format"],
-                        }
-                        for x in chart["x"]
-                    ],
-                    "y": [
-                        {
-                            **datasets[chart["id"]]["columns"][y["columnID"]],
-                            "calculation": y["calculation"],
-                        }
-                        for y in chart["y"]
-                        if y["type"] in ["integer", "float"]
-                        and (
-                            y["calculation"] in prompts.format["calculation"]
-                            or (_ := None)  # 檢查計算方法
-                        )
-                    ],
-                    "filter": [
-                        {
-                            **datasets[chart["id"]]["columns"][f["columnID"]],
-                            "format": f["format"]
-                            if f["type"] not in ["date", "datetime", "space"]
-                            else f["format"]
-                            if (
-                                (
-                                    f["type"] in ["date", "datetime"]
-                                    and (
-                                        f["format"] in prompts.format["date"]
-                                        or (_ := None)
-                                    )
-                                )
-                                or (
-                                    f["type"] == "space"
-                                    and (
-                                        f["format"] in prompts.format["space"]
-                                        or (_ := None)
-                                    )
-                                )
-                            )
-                            else f["format"],
-                        }
-                        for f in chart["filter"]
-                    ],
-                }
-                for chart in response_json["charts"]
-            ]
+            filtered_datasets = _planned_charts(datasets, response.content)
             break
         except Exception as e:
             if setting["debug"]:
@@ -156,31 +120,116 @@ def analytics_planning_agent(state: BasicState):
     return {"response": filtered_datasets}
 
 
-def filter_decision_agent(state: BasicState):
-    exec_time.append(time.perf_counter())
-    state["at"].filter_option_tool(state["response"])
-    exec_time.append(time.perf_counter())
-
-    prompt = prompts.query_generate_template.invoke(
+def _planning_prompt(state: BasicState, datasets):
+    columns_table, _ = compact_columns(datasets.values())
+    plot_chart_prompt = prompts.chart_ploting_template.invoke(  # extract column
         {
             "question": state["question"],
-            "response": state["response"],
+            "datasets": columns_table,
+            "admin_level": prompts.admin_level,
         }
     )
 
+    if setting["debug"]:
+        tokens = estimate_tokens(plot_chart_prompt.to_string())
+        print(f"# analytics_planning_agent prompt: ~{tokens} tokens\n")
+
+    return plot_chart_prompt
+
+
+def _planned_charts(datasets, content):
+    """
+    Parses the last ```json block of the planning answer into charts with the
+    full column metadata. Raises on unknown columns or formats, so the caller retries.
+    """
+
+    response_json = json.loads(
+        list(re.finditer(r"```json(.*?)```", content, re.DOTALL))[-1].group(1)
+    )
+
+    return [
+        {
+            **{k: v for k, v in datasets[chart["id"]].items() if k != "columns"},
+            "x": [
+                {
+                    **datasets[chart["id"]]["columns"][x["columnID"]],
+                    "format": x["format"]
+                    if x["type"] not in ["date", "datetime", "space"]
+                    else x["format"]
+                    if (
+                        (
+                            x["type"] in ["date", "datetime"]
+                            and (
+                                x["format"] in prompts.format["date"]
+                                or (_ := None)
+                            )
+                        )
+                        or (
+                            x["type"] == "space"
+                            and (
+                                x["format"] in prompts.format["space"]
+                                or (_ := None)
+                            )
+                        )
+                    )
+                    else x["format"],
+                }
+                for x in chart["x"]
+            ],
+            "y": [
+                {
+                    **datasets[chart["id"]]["columns"][y["columnID"]],
+                    "calculation": y["calculation"],
+                }
+                for y in chart["y"]
+                if y["type"] in ["integer", "float"]
+                and (
+                    y["calculation"] in prompts.format["calculation"]
+                    or (_ := None)  # 檢查計算方法
+                )
+            ],
+            "filter": [
+                {
+                    **datasets[chart["id"]]["columns"][f["columnID"]],
+                    "format": f["format"]
+                    if f["type"] not in ["date", "datetime", "space"]
+                    else f["format"]
+                    if (
+                        (
+                            f["type"] in ["date", "datetime"]
+                            and (
+                                f["format"] in prompts.format["date"]
+                                or (_ := None)
+                            )
+                        )
+                        or (
+                            f["type"] == "space"
+                            and (
+                                f["format"] in prompts.format["space"]
+                                or (_ := None)
+                            )
+                        )
+                    )
+                    else f["format"],
+                }
+                for f in chart["filter"]
+            ],
+        }
+        for chart in response_json["charts"]
+    ]
+
+
+@timed("node")
+def filter_decision_agent(state: BasicState):
+    timings = state["at"].filter_option_tool(state["response"], state["question"])
+
+    prompt = _filter_prompt(state, timings)
+
     structured_llm = state["llm"].with_structured_output(schema.query_list)
 
     for _ in range(5):
         try:
-            response = structured_llm.invoke(prompt).dict()["querys"]
-            for chart in response:
-                for x in chart["x"]:
-                    if x["type"] not in {"date", "datetime", "space"}:
-                        x.pop("format")
-                for filter in chart["filter"]:
-                    if filter["type"] not in {"date", "datetime", "space"}:
-                        filter.pop("format")
-                chart["filter"] = [chart["filter"]]
+            response = _chosen_filters(structured_llm.invoke(prompt).dict()["querys"])
             break
         except Exception as e:
             if setting["debug"]:
@@ -196,11 +245,42 @@ def filter_decision_agent(state: BasicState):
     return {"response": response}
 
 
+def _filter_prompt(state: BasicState, timings):
+    if setting["debug"] > 2:
+        for timing in timings:
+            print(
+                f"filter-options {timing['id']}/{timing['columnID']}: "
+                f"{timing['elapsed']:.3f}s {timing['error'] or ''}"
+            )
+
+    prompt = prompts.query_generate_template.invoke(
+        {
+            "question": state["question"],
+            "response": state["response"],
+        }
+    )
+
+    return prompt
+
+
+def _chosen_filters(response):
+    for chart in response:
+        for x in chart["x"]:
+            if x["type"] not in {"date", "datetime", "space"}:
+                x.pop("format")
+        for filter in chart["filter"]:
+            if filter["type"] not in {"date", "datetime", "space"}:
+                filter.pop("format")
+        chart["filter"] = [chart["filter"]]
+
+    return response
+
+
+@timed("node")
 def analytics_execution_agent(state: BasicState):
     if setting["debug"]:
         print("# analytics_execution_agent:\n")
 
-    exec_time.append(time.perf_counter())
     state["at"].explore_tool(state["response"])
 
     return {
@@ -208,8 +288,57 @@ def analytics_execution_agent(state: BasicState):
     }
 
 
+def fan_out_datasets(state: BasicState):
+    """
+    Sends every dataset picked by aralia_search_agent to its own
+    `dataset_branch`, all branches run concurrently.
+    """
+
+    # 與循序流程相同, 沒有選到任何資料集就直接失敗, 不回傳空答案
+    if not state["response"]:
+        raise RuntimeError("無法跟搜尋到的星球要資料，程式終止")
+
+    return [
+        Send("dataset_branch", {**state, "response": [dataset]})
+        for dataset in state["response"]
+    ]
+
+
+@timed("node")
+def dataset_branch(state: BasicState):
+    """
+    Plans, picks filters and explores a single dataset. A branch that fails
+    only drops its own charts, so one hard dataset does not fail the others.
+    """
+
+    try:
+        state = {**state, **analytics_planning_agent(state)}
+        # 沒有規劃出圖表就不用再選 filter、取資料
+        if not state["response"]:
+            return {"charts": []}
+
+        for agent in (filter_decision_agent, analytics_execution_agent):
+            state = {**state, **agent(state)}
+    except RuntimeError as e:
+        if setting["debug"]:
+            print(f"資料集 {state['response'][0].get('id')} 略過: {e}")
+        return {"charts": []}
+
+    # analytics_execution_agent 回傳 [charts]
+    return {"charts": state["response"][0]}
+
+
+@timed("node")
+def merge_charts(state: BasicState):
+    if not state["charts"]:
+        raise RuntimeError("所有資料集都無法產出圖表，程式終止")
+
+    # 與循序流程 analytics_execution_agent 的輸出形狀相同
+    return {"response": [state["charts"]]}
+
+
+@timed("node")
 def interpretation_agent(state: BasicState):
-    exec_time.append(time.perf_counter())
     messages = [
         {
             "role": "system",
@@ -230,19 +359,8 @@ def interpretation_agent(state: BasicState):
 
     response = state["llm"].invoke(messages)
 
-    exec_time.append(time.perf_counter())
     if setting["debug"]:
         print("# interpretation_agent:\n")
         print(response.content, end="\n\n")
 
     return {"final_response": response.content}
-
-
-def print_exec_time():
-    """
-    打印每個步驟的執行時間，從第二個步驟開始計算
-    """
-
-    for i, times in enumerate(exec_time):
-        if i > 0:  # 從第二個開始計算
-            print(f"Time taken for {i}th step: {times - exec_time[i - 1]} seconds")
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import setting
+
+# 背景關閉被淘汰 client 的 task, 留著 reference 避免還沒跑完就被回收
+_closing = set()
+
+
+def credential_key(*credentials):
+    """
+    Pool key of a set of credentials. Only the SHA-256 digest is kept as key,
+    and since the password is part of it a wrong password never reaches a
+    client logged in with the right one.
+    """
+
+    return hashlib.sha256("\0".join(credentials).encode()).hexdigest()
+
+
+class ClientPool:
+    """
+    Keeps clients alive between graph invocations, keyed by `credential_key`,
+    so warm requests skip building the LLM, the Aralia login and the handshakes.
+
+    A client unused for `idle` seconds is dropped, and the least recently used
+    ones once more than `maxsize` are pooled. Clients are built outside the
+    pool lock, one build per key at a time; a failed build (e.g. a wrong
+    password) is not pooled. Dropped clients that have an `aclose()` are closed.
+
+    Args:
+        idle (float, optional): Seconds an unused client is kept, defaults to `setting["client_pool"]["idle"]`.
+        maxsize (int, optional): Clients kept, defaults to `setting["client_pool"]["maxsize"]`.
+    """
+
+    def __init__(self, idle=None, maxsize=None):
+        self.idle = idle or setting["client_pool"]["idle"]
+        self.maxsize = maxsize or setting["client_pool"]["maxsize"]
+
+        self._clients = OrderedDict()  # key -> (client, last_used)
+        self._building = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, factory):
+        """
+        The pooled client of `key`, built with `factory()` on a miss.
+        """
+
+        with self._lock:
+            evicted = self._evict_idle()
+            if (entry := self._clients.get(key)) is None:
+                building = self._building.setdefault(key, threading.Lock())
+            else:
+                self._clients[key] = (entry[0], time.monotonic())
+                self._clients.move_to_end(key)
+                self._stats["hits"] += 1
+
+        self._close(evicted)
+        if entry is not None:
+            return entry[0]
+
+        with building:
+            # 同一組帳號同時進來時, 只有第一個真的建立, 其他等它建好直接用
+            with self._lock:
+                if (entry := self._clients.get(key)) is not None:
+                    self._stats["hits"] += 1
+                    return entry[0]
+                self._stats["misses"] += 1
+
+            try:
+                client = factory()
+            except BaseException:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+
+            evicted = []
+            with self._lock:
+                self._building.pop(key, None)
+                self._clients[key] = (client, time.monotonic())
+                while len(self._clients) > self.maxsize:
+                    evicted.append(self._clients.popitem(last=False)[1][0])
+                    self._stats["evictions"] += 1
+
+        self._close(evicted)
+
+        return client
+
+    def _evict_idle(self):
+        evicted = []
+        deadline = time.monotonic() - self.idle
+        # 依最後使用時間排序, 從最舊的開始清
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if last_used > deadline:
+                break
+            del self._clients[key]
+            evicted.append(client)
+            self._stats["evictions"] += 1
+
+        return evicted
+
+    def _drain(self):
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            self._clients.clear()
+
+        return clients
+
+    @staticmethod
+    def _close(clients):
+        """
+        Closes dropped clients outside the pool lock: as a task on the running
+        event loop, or right away when the caller has none.
+        """
+
+        for client in clients:
+            if (aclose := getattr(client, "aclose", None)) is None:
+                continue
+
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(aclose())
+            else:
+                task = loop.create_task(aclose())
+                _closing.add(task)
+                task.add_done_callback(_closing.discard)
+
+    def clear(self):
+        self._close(self._drain())
+
+    async def aclose(self):
+        """Empties the pool, closing the clients that have an `aclose()`."""
+
+        for client in self._drain():
+            if (aclose := getattr(client, "aclose", None)) is not None:
+                await aclose()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._clients)}
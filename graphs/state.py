@@ -1,4 +1,5 @@
-from typing import Any, TypedDict
+import operator
+from typing import Annotated, Any, TypedDict
 
 
 class BasicState(TypedDict):
@@ -8,3 +9,5 @@ class BasicState(TypedDict):
     language: str
     llm: Any
     at: Any  # aralia tools
+    search_scores: dict  # BM25 score of each dataset kept by aralia_search_agent
+    charts: Annotated[list, operator.add]  # charts of every dataset branch in fan-out mode
@@ -2,14 +2,12 @@
 A FastMCP server that provides tools for searching related data to user's query.
 """
 
-from mcp import types
-from graphs import AssistantGraph
+import asyncio
+import functools
 import os
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
-from mcp.server import Server
-import mcp.types as types
-from mcp_src.aralia_tools import AraliaTools
+from config import setting
 from mcp_src.prompts import (
     datasets_extract_prompt,
     chart_ploting_prompt,
@@ -21,8 +19,25 @@ mcp = FastMCP("aralia-data-server")
 
 load_dotenv()
 
-aralia_tools = AraliaTools(
-    os.environ["ARALIA_USERNAME"], os.environ["ARALIA_PASSWORD"])
+_aralia_tools = None
+_background_tasks = set()
+
+
+def get_aralia_tools():
+    """
+    AraliaTools 延後到第一次呼叫 tool 才 import 及建立, 登入也延後到第一個 request,
+    讓 MCP client 的 initialize 不必等待網路。
+    """
+    global _aralia_tools
+
+    if _aralia_tools is None:
+        from mcp_src.aralia_tools import AsyncAraliaTools
+
+        _aralia_tools = AsyncAraliaTools(
+            os.environ["ARALIA_USERNAME"], os.environ["ARALIA_PASSWORD"])
+
+    return _aralia_tools
+
 
 data = dict()
 
@@ -30,13 +45,30 @@ question = "幫我用aralia回答'酒駕致死道路類別以哪種類型居多?
 answer = "[{'sourceURL': 'https://tw-traffic.araliadata.io', 'id': 'Sp53HruAx6xZUAX5ERpKBz', 'name': '交 通事故紀錄表', 'x': [{'columnID': 'mEaKbXG9Y93uUVi9DSK9YJ', 'displayName': '道路類別', 'type': 'nominal'}], 'y': [{'columnID': 'ByGDZwjjqgQqSWvQ4iX9WF', 'displayName': '死亡人數', 'calculation': 'sum'}], 'filter': [[{'columnID': 'MqV9TaZnHWAoR2ZBNCSLyn', 'displayName': '當事者飲酒情形', 'type': 'nominal', 'operator': 'in', 'value': ['經呼氣檢測 0.16~0.25 mg/L或血液檢測 0.031%~0.05%', '經呼氣檢測 0.26~0.40 mg/L或血液檢測 0.051%~0.08%', '經呼氣檢測 0.41~0.55 mg/L或血液檢測 0.081%~0.11%', '經呼氣檢測 0.56~0.80 mg/L或血液檢測 0.111%~0.16%', '經呼氣檢測超過 0.80 mg/L或血液檢測超過 0.16%']}]], 'data': [{'x': [['市區道路']], 'values': [496]}, {'x': [['村里道路']], 'values': [169]}, {'x': [['省道']], 'values': [118]}, {'x': [['縣道']], 'values': [71]}, {'x': [['鄉道']], 'values': [47]}, {'x': [['國道']], 'values': [29]}, {'x': [['其他 ']], 'values': [25]}, {'x': [['專用道路']], 'values': [2]}]}]"
 
 
+def timed_tool(function):
+    """
+    Records each tool call as a `tool` span. aralia.metrics is imported on
+    the first call, like AraliaTools, to keep startup fast.
+    """
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        from aralia.metrics import span
+
+        with span("tool", function.__name__):
+            return await function(*args, **kwargs)
+
+    return wrapper
+
+
 def debug(text: any):
     with open("debug.txt", "a", encoding='utf-8') as file:
         file.write(str(text))
 
 
 @mcp.tool()
-def search_aralia_data_first_step(question: str) -> list[str]:
+@timed_tool
+async def search_aralia_data_first_step(question: str) -> list[str]:
     """
     First step to get related structured data to user's question from Aralia.
 
@@ -47,7 +79,7 @@ def search_aralia_data_first_step(question: str) -> list[str]:
         1. The related datasets to the user's question.
         2. Instruction and task to the next step's input.
     """
-    data = aralia_tools.search_tool(question)
+    data = await get_aralia_tools().search_tool(question)
 
     return [
         data,
@@ -56,7 +88,8 @@ def search_aralia_data_first_step(question: str) -> list[str]:
 
 
 @mcp.tool()
-def search_aralia_data_second_step(datasets: list[dict]) -> list[str]:
+@timed_tool
+async def search_aralia_data_second_step(datasets: list[dict]) -> list[str]:
     """
     Second step to get related structured data to user's question from Aralia.
 
@@ -68,7 +101,14 @@ def search_aralia_data_second_step(datasets: list[dict]) -> list[str]:
         2. Instruction and task to the next step's input.
     """
 
-    datasets_metadata = aralia_tools.column_metadata_tool(datasets)
+    aralia_tools = get_aralia_tools()
+    datasets_metadata = await aralia_tools.column_metadata_tool(datasets)
+
+    if setting["cache"]["filter_options"]["warm_up"]:
+        # 在 client 規劃圖表的同時預先載入第三步需要的候選值
+        task = asyncio.create_task(aralia_tools.warm_filter_options(datasets_metadata))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
     return [
         datasets_metadata,
@@ -77,19 +117,23 @@ def search_aralia_data_second_step(datasets: list[dict]) -> list[str]:
 
 
 @mcp.tool()
-def search_aralia_data_third_step(charts: list[dict]) -> list[str]:
+@timed_tool
+async def search_aralia_data_third_step(
+    charts: list[dict], question: str = ""
+) -> list[str]:
     """
     Third step to get related structured data to user's question from Aralia.
 
     Args:
         charts (list[dict]): The charts that are related to the user's question
+        question (str): The user's question, used to narrow down filters with many candidate values
 
     Returns:
         1. aralia api request with candidate filter values
         2. Instruction and task to the next step's input.
     """
 
-    aralia_tools.filter_option_tool(charts)
+    await get_aralia_tools().filter_option_tool(charts, question)
 
     return [
         charts,
@@ -98,12 +142,17 @@ def search_aralia_data_third_step(charts: list[dict]) -> list[str]:
 
 
 @mcp.tool()
-def search_aralia_data_final_step(charts: list[dict]) -> list[dict]:
+@timed_tool
+async def search_aralia_data_final_step(
+    charts: list[dict], columnar: bool = False, max_rows: int = 50
+) -> list[dict]:
     """
     Final step to get related structured data to user's question from Aralia.
     
     Args:
         charts (list[dict]): The charts that are related to the user's question
+        columnar (bool): Return each chart's data column-oriented: distinct x labels once plus per-row codes and value columns
+        max_rows (int): Rows returned per chart, charts with more rows are marked "truncated". Raise it only when the full series is needed
     
     Returns:
         charts data related to the user's question
@@ -118,7 +167,7 @@ def search_aralia_data_final_step(charts: list[dict]) -> list[dict]:
                 filter.pop("format")
         chart["filter"] = [chart["filter"]]
 
-    aralia_tools.explore_tool(charts)
+    await get_aralia_tools().explore_tool(charts, columnar, max_rows)
 
     return charts
 
@@ -173,5 +222,22 @@ def search_aralia_data_final_step(charts: list[dict]) -> list[dict]:
 #     }
 #   ])
 
+
+@mcp.resource("metrics://prometheus", mime_type="text/plain")
+def metrics_prometheus() -> str:
+    """Latency histograms of tool calls, Aralia requests and retries in Prometheus text format."""
+    from aralia.metrics import registry
+
+    return registry.to_prometheus()
+
+
+@mcp.resource("metrics://json", mime_type="application/json")
+def metrics_json() -> dict:
+    """Latency histograms of tool calls, Aralia requests and retries as JSON."""
+    from aralia.metrics import registry
+
+    return registry.to_json()
+
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+from aralia.singleflight import AsyncSingleFlight
+
+
+def test_coalesces_callers_on_the_same_loop():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return {"rows": [1, 2]}
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", call) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert results == [{"rows": [1, 2]}] * 5
+    assert flights.stats() == {
+        "calls": 5,
+        "requests": 1,
+        "collapsed": 4,
+        "in_flight": 0,
+    }
+
+
+def test_separate_loops_do_not_share_flights():
+    flights = AsyncSingleFlight()
+    started = threading.Barrier(2)
+    results, errors = [], []
+
+    async def call():
+        await asyncio.sleep(0.1)
+        return threading.get_ident()
+
+    async def request():
+        started.wait()
+        return await flights.do("key", call)
+
+    def run():
+        try:
+            results.append(asyncio.run(request()))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # 每個 loop 各自送出, 結果來自自己的 thread
+    assert sorted(results) == sorted(thread.ident for thread in threads)
+    assert flights.stats()["requests"] == 2